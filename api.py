@@ -1,23 +1,261 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, send_file, stream_with_context, url_for
+import atexit
+import itertools
+import os
 import sqlite3
+import tempfile
 
-app = Flask(__name__)
-DATABASE = 'student_management.db'
+import archive
+import batch
+import cache
+import desktop_api
+import excel_io
+import ingest
+import metrics
+import negotiation
+import reports
+import search
+import snapshot
+from db import (CHANGE_LOG_PRUNE_EVERY, DATABASE, ConnectionPool, InvalidDateError, get_db, init_app, migrate,
+                prune_change_log, to_display_date, to_iso_date)
+from streaming import ndjson_response, release_on_close, wants_stream
 
+bp = Blueprint('api', __name__)
 
-def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STUDENT_FIELDS = ['id', 'first_name', 'last_name', 'middle_name', 'birth_date', 'birth_date_iso', 'phone', 'email',
+                  'address', 'group_id']
+EVENT_FIELDS = ['id', 'student_id', 'date', 'date_iso', 'title', 'description', 'category']
+# sort -> (ORDER BY, оператор keyset-условия)
+EVENT_SORTS = {
+    'id': ('e.id', '>'),
+    '-id': ('e.id DESC', '<'),
+    'date': ('e.date_iso, e.id', '>'),
+    '-date': ('e.date_iso DESC, e.id DESC', '<'),
+}
+STUDENT_INCLUDES = ('events', 'periods', 'group')
 
 
-@app.route('/students', methods=['GET', 'POST'])
+def parse_fields(args, allowed_fields):
+    fields = args.get('fields')
+    if not fields:
+        return list(allowed_fields)
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in allowed_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # id нужен всегда: по нему строится курсор следующей страницы
+    if 'id' not in selected:
+        selected.insert(0, 'id')
+    return selected
+
+
+def parse_page_args(args):
+    # Испорченный курсор — ошибка клиента, а не первая страница
+    after_id = int_arg(args, 'after_id') or 0
+    limit = int_arg(args, 'limit')
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return after_id, min(limit, MAX_PAGE_SIZE)
+
+
+def fetch_page(cursor, table, fields, after_id, limit):
+    # Keyset-пагинация: WHERE id > ? использует первичный ключ, OFFSET не нужен
+    cursor.execute(f'SELECT {", ".join(fields)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?',
+                   (after_id, limit + 1))
+    rows = cursor.fetchall()
+    items = [dict(ix) for ix in rows[:limit]]
+    return items, items[-1]['id'] if len(rows) > limit else None
+
+
+def paginate(cursor, table, allowed_fields, expand=None):
+    try:
+        fields = parse_fields(request.args, allowed_fields)
+        after_id, limit = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    items, next_cursor = fetch_page(cursor, table, fields, after_id, limit)
+    if expand is not None:
+        expand(items)
+    next_link = None
+    if next_cursor is not None:
+        params = {'after_id': next_cursor, 'limit': limit}
+        for name in ('fields', 'include', 'format'):
+            if request.args.get(name):
+                params[name] = request.args[name]
+        next_link = url_for(request.endpoint, **params)
+    return negotiation.render(negotiation.list_body(items, fields, next_cursor=next_cursor, next=next_link))
+
+
+def stream_table(conn, table, allowed_fields):
+    try:
+        fields = parse_fields(request.args, allowed_fields)
+        after_id, _ = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {", ".join(fields)} FROM {table} WHERE id > ? ORDER BY id', (after_id,))
+    return ndjson_response(cursor)
+
+
+def int_arg(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+
+def event_filters(args):
+    clauses, params = [], []
+    student_id = int_arg(args, 'student_id')
+    if student_id is not None:
+        clauses.append('e.student_id = ?')
+        params.append(student_id)
+    if args.get('group'):
+        # Подзапрос идёт по idx_groups_group_name и idx_students_group_id, события — по idx_events_student_date
+        clauses.append('''e.student_id IN (
+            SELECT s.id FROM students s JOIN groups g ON g.id = s.group_id WHERE g.group_name = ?
+        )''')
+        params.append(args['group'])
+    if args.get('category'):
+        clauses.append('e.category = ?')
+        params.append(args['category'])
+    if args.get('from'):
+        clauses.append('e.date_iso >= ?')
+        params.append(to_iso_date(args['from']))
+    if args.get('to'):
+        clauses.append('e.date_iso <= ?')
+        params.append(to_iso_date(args['to']))
+    return clauses, params
+
+
+def list_events(conn):
+    try:
+        fields = parse_fields(request.args, EVENT_FIELDS)
+        after_id, limit = parse_page_args(request.args)
+        clauses, params = event_filters(request.args)
+        sort = request.args.get('sort', 'id')
+        if sort not in EVENT_SORTS:
+            raise ValueError(f"Unknown sort: {sort}; expected one of {', '.join(EVENT_SORTS)}")
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    order_by, operator = EVENT_SORTS[sort]
+    by_date = sort.lstrip('-') == 'date'
+    # С диапазоном дат в выборку попадают и архивы прошлых учебных лет (archive.py)
+    source = archive.events_source(conn, request.args.get('from'), request.args.get('to'))
+    if by_date:
+        # У событий без распознанной даты нет места в порядке по дате, они видны только при sort=id
+        clauses.append('e.date_iso IS NOT NULL')
+        if request.args.get('after_id'):
+            after_date = request.args.get('after_date')
+            if after_date:
+                after_date = to_iso_date(after_date)
+            else:
+                # Курсор без даты (собран вручную): берём дату самого события, а не начинаем сначала
+                row = conn.execute(f'SELECT date_iso FROM {source} e WHERE e.id = ?', (after_id,)).fetchone()
+                if row is None or row[0] is None:
+                    return jsonify({'message': f'after_id {after_id} does not match a dated event; '
+                                               'pass after_date from the next link'}), 400
+                after_date = row[0]
+            clauses.append(f'(e.date_iso, e.id) {operator} (?, ?)')
+            params += [after_date, after_id]
+        elif request.args.get('after_date'):
+            return jsonify({'message': 'after_date requires after_id'}), 400
+    elif request.args.get('after_id'):
+        clauses.append(f'e.id {operator} ?')
+        params.append(after_id)
+    columns = ', '.join(f'e.{field}' for field in fields)
+    query = f"FROM {source} e WHERE {' AND '.join(clauses) or '1'} ORDER BY {order_by}"
+
+    cursor = conn.cursor()
+    if wants_stream():
+        cursor.execute(f'SELECT {columns} {query}', params)
+        return ndjson_response(cursor)
+    # date_iso нужен для курсора следующей страницы, даже если его нет в fields
+    cursor.execute(f'SELECT {columns}, e.date_iso AS cursor_date {query} LIMIT ?', params + [limit + 1])
+    rows = cursor.fetchall()
+    items = [dict(ix) for ix in rows[:limit]]
+    cursor_dates = [item.pop('cursor_date') for item in items]
+    next_link = None
+    if len(rows) > limit:
+        params = {name: value for name, value in request.args.items() if name not in ('after_id', 'after_date')}
+        params['after_id'] = items[-1]['id']
+        if by_date:
+            params['after_date'] = cursor_dates[-1]
+        next_link = url_for(request.endpoint, **params)
+    next_cursor = items[-1]['id'] if len(rows) > limit else None
+    return negotiation.render(negotiation.list_body(items, fields, next_cursor=next_cursor, next=next_link))
+
+
+def parse_includes(args):
+    includes = [name.strip() for name in args.get('include', '').split(',') if name.strip()]
+    unknown = [name for name in includes if name not in STUDENT_INCLUDES]
+    if unknown:
+        raise ValueError(f"Unknown include: {', '.join(unknown)}; expected {', '.join(STUDENT_INCLUDES)}")
+    return includes
+
+
+def load_includes(conn, students, includes):
+    # По одному запросу на связь для всей страницы студентов, без запроса на каждого студента
+    if not students or not includes:
+        return
+    ids = [student['id'] for student in students]
+    placeholders = ', '.join('?' * len(ids))
+    if 'events' in includes:
+        events = {student_id: [] for student_id in ids}
+        for row in conn.execute(f'''
+            SELECT {', '.join(EVENT_FIELDS)} FROM events WHERE student_id IN ({placeholders})
+            ORDER BY student_id, date_iso, id
+        ''', ids):
+            events[row['student_id']].append(dict(row))
+        for student in students:
+            student['events'] = events[student['id']]
+    if 'periods' in includes:
+        periods = {student_id: [] for student_id in ids}
+        for row in conn.execute(f'''
+            SELECT student_id, start_date, end_date, group_name FROM education_periods
+            WHERE student_id IN ({placeholders}) ORDER BY student_id, rowid
+        ''', ids):
+            periods[row['student_id']].append({key: row[key] for key in ('start_date', 'end_date', 'group_name')})
+        for student in students:
+            student['periods'] = periods[student['id']]
+    if 'group' in includes:
+        groups = {row['student_id']: {'id': row['id'], 'group_name': row['group_name']} for row in conn.execute(f'''
+            SELECT s.id AS student_id, g.id, g.group_name FROM students s JOIN groups g ON g.id = s.group_id
+            WHERE s.id IN ({placeholders})
+        ''', ids)}
+        for student in students:
+            student['group'] = groups.get(student['id'])
+
+
+@bp.app_errorhandler(sqlite3.IntegrityError)
+def handle_integrity_error(e):
+    return jsonify({'message': f'Constraint violation: {e}'}), 409
+
+
+@bp.app_errorhandler(InvalidDateError)
+def handle_invalid_date(e):
+    return jsonify({'message': str(e)}), 400
+
+
+@bp.route('/students', methods=['GET', 'POST'])
+@cache.cached()
 def handle_students():
     conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
         new_student = request.get_json()
+        new_student['birth_date'] = to_display_date(new_student['birth_date'])
         cursor.execute('''
             INSERT INTO students (first_name, last_name, middle_name, birth_date, phone, email, address) 
             VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -27,25 +265,39 @@ def handle_students():
         return jsonify({'message': 'Student added successfully'}), 201
 
     elif request.method == 'GET':
-        cursor.execute('SELECT * FROM students')
-        students = cursor.fetchall()
-        return jsonify([dict(ix) for ix in students]), 200
+        # Страницы списка читаются из основной базы (сразу видны свои записи), выгрузка всей таблицы
+        # потоком — из реплики (snapshot.py)
+        if wants_stream():
+            return stream_table(snapshot.get_snapshot_db(), 'students', STUDENT_FIELDS)
+        try:
+            includes = parse_includes(request.args)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        return paginate(cursor, 'students', STUDENT_FIELDS, lambda items: load_includes(conn, items, includes))
 
 
-@app.route('/students/<int:id>', methods=['GET', 'PUT', 'DELETE'])
+@bp.route('/students/<int:id>', methods=['GET', 'PUT', 'DELETE'])
+@cache.cached()
 def handle_student(id):
     conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'GET':
+        try:
+            includes = parse_includes(request.args)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
         cursor.execute('SELECT * FROM students WHERE id=?', (id,))
         student = cursor.fetchone()
         if student:
-            return jsonify(dict(student)), 200
+            student = dict(student)
+            load_includes(conn, [student], includes)
+            return jsonify(student), 200
         return jsonify({'message': 'Student not found'}), 404
 
     elif request.method == 'PUT':
         updated_student = request.get_json()
+        updated_student['birth_date'] = to_display_date(updated_student['birth_date'])
         cursor.execute('''
             UPDATE students SET first_name=?, last_name=?, middle_name=?, birth_date=?, phone=?, email=?, address=? 
             WHERE id=?
@@ -61,13 +313,32 @@ def handle_student(id):
         return jsonify({'message': 'Student deleted successfully'}), 200
 
 
-@app.route('/events', methods=['GET', 'POST'])
+@bp.route('/events', methods=['GET', 'POST'])
+@cache.cached()
 def handle_events():
     conn = get_db()
     cursor = conn.cursor()
 
-    if request.method == 'POST':
+    event_queue = current_app.extensions.get('event_queue')
+    if request.method == 'POST' and event_queue is not None:
+        try:
+            params = batch.validate_event(request.get_json(silent=True))
+        except (ValueError, TypeError) as e:
+            return jsonify({'message': str(e)}), 400
+        # Внешний ключ проверяем до 202: после ответа клиенту отказ записи он бы уже не увидел
+        if cursor.execute('SELECT 1 FROM students WHERE id = ?', (params[0],)).fetchone() is None:
+            return jsonify({'message': f'Student {params[0]} not found'}), 422
+        try:
+            accepted = event_queue.submit(params)
+        except ingest.IngestStopped as e:
+            return jsonify({'message': str(e)}), 503
+        if not accepted:
+            return jsonify({'message': 'Ingestion queue is full'}), 429, {'Retry-After': '1'}
+        return jsonify({'message': 'Event queued'}), 202
+
+    elif request.method == 'POST':
         new_event = request.get_json()
+        new_event['date'] = to_display_date(new_event['date'])
         cursor.execute('''
             INSERT INTO events (student_id, date, title, description, category) 
             VALUES (?, ?, ?, ?, ?)
@@ -77,12 +348,11 @@ def handle_events():
         return jsonify({'message': 'Event added successfully'}), 201
 
     elif request.method == 'GET':
-        cursor.execute('SELECT * FROM events')
-        events = cursor.fetchall()
-        return jsonify([dict(ix) for ix in events]), 200
+        return list_events(snapshot.get_snapshot_db() if wants_stream() else conn)
 
 
-@app.route('/events/<int:id>', methods=['GET', 'PUT', 'DELETE'])
+@bp.route('/events/<int:id>', methods=['GET', 'PUT', 'DELETE'])
+@cache.cached()
 def handle_event(id):
     conn = get_db()
     cursor = conn.cursor()
@@ -96,6 +366,7 @@ def handle_event(id):
 
     elif request.method == 'PUT':
         updated_event = request.get_json()
+        updated_event['date'] = to_display_date(updated_event['date'])
         cursor.execute('''
             UPDATE events SET student_id=?, date=?, title=?, description=?, category=? 
             WHERE id=?
@@ -110,5 +381,204 @@ def handle_event(id):
         return jsonify({'message': 'Event deleted successfully'}), 200
 
 
+BATCH_OPERATIONS = {'POST': 'create', 'PUT': 'update', 'DELETE': 'delete'}
+
+
+def handle_batch(table, fields, validate):
+    operation = BATCH_OPERATIONS[request.method]
+    mode = request.args.get('mode', 'atomic')
+    try:
+        committed, results = batch.run_batch(get_db(), operation, table, fields, validate,
+                                             request.get_json(silent=True), mode)
+    except batch.BatchError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'mode': mode, 'committed': committed, 'results': results}), 200 if committed else 400
+
+
+@bp.route('/students/batch', methods=['POST', 'PUT', 'DELETE'])
+def handle_students_batch():
+    return handle_batch('students', batch.STUDENT_WRITE_FIELDS, batch.validate_student)
+
+
+@bp.route('/events/batch', methods=['POST', 'PUT', 'DELETE'])
+def handle_events_batch():
+    return handle_batch('events', batch.EVENT_WRITE_FIELDS, batch.validate_event)
+
+
+@bp.route('/ingest/metrics', methods=['GET'])
+def ingest_metrics():
+    event_queue = current_app.extensions.get('event_queue')
+    mode = current_app.config['EVENT_INGEST_MODE']
+    if event_queue is None:
+        return jsonify({'mode': mode}), 200
+    return jsonify(dict(event_queue.metrics(), mode=mode)), 200
+
+
+def build_report(group_name):
+    date_from, date_to = request.args.get('from'), request.args.get('to')
+    try:
+        after_id, limit = parse_page_args(request.args)
+        result = reports.summary(snapshot.get_snapshot_db(), group_name, date_from, date_to, request.args.get('granularity', 'month'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    body = {'group': group_name, 'from': date_from, 'to': date_to}
+    body.update({key: [dict(ix) for ix in rows] for key, rows in result.items()})
+    body['total'] = sum(row['events'] for row in body['by_category'])
+
+    if group_name is not None and request.args.get('detail') in ('1', 'true'):
+        rows = reports.detail(snapshot.get_snapshot_db(), group_name, date_from, date_to, after_id, limit + 1)
+        columns = ['id', 'student_id', 'last_name', 'first_name', 'middle_name', 'date', 'title', 'description',
+                   'category']
+        items = [dict(zip(columns, row)) for row in rows[:limit]]
+        body['detail'] = {'items': items, 'next_cursor': items[-1]['id'] if len(rows) > limit else None}
+    return jsonify(body), 200
+
+
+@bp.route('/reports/groups/<group_name>', methods=['GET'])
+@cache.cached()
+def group_report(group_name):
+    return build_report(group_name)
+
+
+@bp.route('/reports/faculty', methods=['GET'])
+@cache.cached()
+def faculty_report():
+    return build_report(None)
+
+
+@bp.route('/search', methods=['GET'])
+@cache.cached()
+def handle_search():
+    text = request.args.get('q', '')
+    search_type = request.args.get('type')
+    limit = min(request.args.get('limit', search.SEARCH_LIMIT, type=int), MAX_PAGE_SIZE)
+    if search_type not in (None, 'students', 'events'):
+        return jsonify({'message': f'Unknown search type: {search_type}'}), 400
+
+    conn = get_db()
+    result = {}
+    if search_type in (None, 'students'):
+        result['students'] = [dict(ix) for ix in search.search_students(conn, text, limit)]
+    if search_type in (None, 'events'):
+        result['events'] = [dict(ix) for ix in search.search_events(conn, text, limit)]
+    return jsonify(result), 200
+
+
+@bp.route('/export', methods=['GET'])
+def export_students():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in excel_io.EXPORT_FORMATS:
+        return jsonify({'message': f'Unsupported export format: {export_format}'}), 400
+
+    conn = snapshot.get_snapshot_db()
+    if export_format == 'csv':
+        cursor = conn.cursor()
+        cursor.execute(excel_io.EXPORT_STUDENTS_SQL)
+        response = Response(stream_with_context(excel_io.iter_csv_chunks(cursor, excel_io.EXPORT_HEADERS)),
+                            mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename=students.csv'
+        return release_on_close(response)
+
+    # xlsx и parquet пишутся во временный файл: оба формата требуют финализации в конце
+    fd, file_path = tempfile.mkstemp(suffix=f'.{export_format}')
+    os.close(fd)
+    try:
+        excel_io.export_students(conn, file_path, export_format)
+    except RuntimeError as e:
+        os.remove(file_path)
+        return jsonify({'message': str(e)}), 501
+    response = send_file(file_path, as_attachment=True, download_name=f'students.{export_format}')
+    response.call_on_close(lambda: os.remove(file_path))
+    return response
+
+
+def config_from_env():
+    return {
+        'DATABASE': os.environ.get('STUDENT_DATABASE', DATABASE),
+        # EVENT_INGEST_MODE=queue: POST /events ставит событие в очередь, запись идёт пакетами в фоновом потоке
+        'EVENT_INGEST_MODE': os.environ.get('EVENT_INGEST_MODE', 'sync'),
+        'EVENT_INGEST_QUEUE_SIZE': int(os.environ.get('EVENT_INGEST_QUEUE_SIZE', ingest.INGEST_QUEUE_SIZE)),
+        'EVENT_INGEST_BATCH_SIZE': int(os.environ.get('EVENT_INGEST_BATCH_SIZE', ingest.INGEST_BATCH_SIZE)),
+        'EVENT_INGEST_FLUSH_INTERVAL': float(os.environ.get('EVENT_INGEST_FLUSH_INTERVAL',
+                                                            ingest.INGEST_FLUSH_INTERVAL)),
+        # Запросы дольше порога пишутся в лог вместе с EXPLAIN QUERY PLAN
+        'SLOW_QUERY_THRESHOLD': float(os.environ.get('SLOW_QUERY_THRESHOLD_MS',
+                                                     metrics.SLOW_QUERY_THRESHOLD * 1000)) / 1000,
+        # STUDENT_API_PROFILING=1 разрешает ?profile=1 и выборочное профилирование доли запросов
+        'PROFILING': os.environ.get('STUDENT_API_PROFILING') == '1',
+        'PROFILE_SAMPLE_RATE': float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+        'PROFILE_DIR': os.environ.get('PROFILE_DIR', 'profiles'),
+        # SNAPSHOT_MODE=replica: отчёты, выгрузки и потоковые выгрузки таблиц читаются из копии базы, отстающей
+        # не больше чем на SNAPSHOT_MAX_AGE секунд (страницы списков и записи по id — всегда из основной);
+        # live — всё из основной базы
+        'SNAPSHOT_MODE': os.environ.get('SNAPSHOT_MODE', 'replica'),
+        'SNAPSHOT_MAX_AGE': float(os.environ.get('SNAPSHOT_MAX_AGE', snapshot.SNAPSHOT_MAX_AGE)),
+        'SNAPSHOT_DATABASE': os.environ.get('SNAPSHOT_DATABASE'),
+        # Сжатие ответов по Accept-Encoding (gzip/deflate)
+        'COMPRESSION_LEVEL': int(os.environ.get('COMPRESSION_LEVEL', negotiation.COMPRESSION_LEVEL)),
+        'COMPRESSION_MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', negotiation.COMPRESSION_MIN_SIZE)),
+        # Воркеры serve.py получают базу, уже подготовленную мастером
+        'MIGRATE': True,
+    }
+
+
+def prepare_database(conn):
+    migrate(conn)
+    prune_change_log(conn)
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.update(config_from_env())
+    app.config.update(config or {})
+
+    pool = ConnectionPool(app.config['DATABASE'], factory=metrics.InstrumentedConnection)
+    init_app(app, pool, row_factory=sqlite3.Row)
+    if app.config['MIGRATE']:
+        with pool.connection() as conn:
+            prepare_database(conn)
+    response_cache = cache.ResponseCache()
+    cache.init_app(app, response_cache)
+    metrics.init_app(app)
+    negotiation.init_app(app)
+
+    if app.config['SNAPSHOT_MODE'] == 'replica' and app.config['DATABASE'] != ':memory:':
+        service = snapshot.SnapshotService(
+            app.config['DATABASE'],
+            path=app.config['SNAPSHOT_DATABASE'],
+            max_age=app.config['SNAPSHOT_MAX_AGE'],
+            factory=metrics.InstrumentedConnection,
+            # Закэшированные ответы по старой копии сбрасываем, как только реплика обновилась
+            on_refresh=lambda: response_cache.invalidate('/reports', '/api'),
+        )
+        snapshot.init_app(app, service)
+        atexit.register(service.stop)
+
+    if app.config['EVENT_INGEST_MODE'] == 'queue':
+        event_queue = ingest.EventIngestQueue(
+            pool,
+            max_size=app.config['EVENT_INGEST_QUEUE_SIZE'],
+            batch_size=app.config['EVENT_INGEST_BATCH_SIZE'],
+            flush_interval=app.config['EVENT_INGEST_FLUSH_INTERVAL'],
+            on_flush=lambda: cache.invalidate_resource(response_cache, '/events'),
+        ).start()
+        app.extensions['event_queue'] = event_queue
+        atexit.register(event_queue.stop)
+
+    # Журнал изменений читает только десктоп; без него он рос бы с каждой записью через API
+    writes = itertools.count(1)
+
+    @app.after_request
+    def prune_changes(response):
+        if (request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400
+                and next(writes) % CHANGE_LOG_PRUNE_EVERY == 0):
+            prune_change_log(get_db())
+        return response
+
+    app.register_blueprint(bp)
+    app.register_blueprint(desktop_api.bp)
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
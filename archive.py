@@ -0,0 +1,252 @@
+import argparse
+import os
+import sqlite3
+from datetime import date, datetime
+
+from db import DATABASE, connect, migrate, prune_change_log, to_iso_date
+
+ARCHIVE_DIR = 'archive'
+# Сколько последних учебных лет (включая текущий) остаются в основной базе
+ARCHIVE_KEEP_YEARS = 2
+# Учебный год начинается 1 сентября
+ACADEMIC_YEAR_START = '09-01'
+# SQLite по умолчанию разрешает 10 подключённых баз
+MAX_ATTACHED_ARCHIVES = 9
+
+EVENT_COLUMNS = 'id, student_id, date, title, description, category, date_iso'
+ACADEMIC_YEAR_SQL = f"CAST(substr(date_iso, 1, 4) AS INTEGER) - (substr(date_iso, 6, 5) < '{ACADEMIC_YEAR_START}')"
+
+
+def academic_year(day):
+    day = date.fromisoformat(to_iso_date(day))
+    return day.year if day.strftime('%m-%d') >= ACADEMIC_YEAR_START else day.year - 1
+
+
+def year_bounds(year):
+    return f'{year}-{ACADEMIC_YEAR_START}', f'{year + 1}-{ACADEMIC_YEAR_START}'
+
+
+def default_cutoff(keep_years=ARCHIVE_KEEP_YEARS, today=None):
+    return year_bounds(academic_year(today or date.today()) - keep_years + 1)[0]
+
+
+def schema_name(year):
+    return f'archive_{year}'
+
+
+def database_dir(conn):
+    path = next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+    return os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+
+
+def archive_path(conn, relative_path):
+    # В реестре пути хранятся относительно основной базы, чтобы каталог можно было переносить целиком
+    return os.path.join(database_dir(conn), relative_path)
+
+
+def attach(conn, year, path):
+    conn.execute('ATTACH DATABASE ? AS ' + schema_name(year), (path,))
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema_name(year)}.events (
+            id INTEGER PRIMARY KEY, student_id INTEGER, date TEXT, title TEXT, description TEXT, category TEXT,
+            date_iso TEXT
+        )
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {schema_name(year)}.idx_events_date_iso ON events(date_iso)')
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {schema_name(year)}.idx_events_student_date ON events(student_id, date_iso)
+    ''')
+
+
+def attached_archives(conn):
+    return {row[1] for row in conn.execute('PRAGMA database_list') if row[1].startswith('archive_')}
+
+
+def events_source(conn, date_from=None, date_to=None):
+    # Без диапазона дат — только основная таблица; архивы подключаются, если диапазон до них дотягивается.
+    # Подключение живёт до возврата соединения в пул (ConnectionPool.release отключает архивы)
+    if not date_from and not date_to:
+        return 'main.events'
+    date_from = to_iso_date(date_from) if date_from else None
+    date_to = to_iso_date(date_to) if date_to else None
+    archives = conn.execute('''
+        SELECT academic_year, path FROM event_archives
+        WHERE (? IS NULL OR date_to >= ?) AND (? IS NULL OR date_from <= ?)
+        ORDER BY academic_year
+    ''', (date_from, date_from, date_to, date_to)).fetchall()
+    if not archives:
+        return 'main.events'
+    needed = {schema_name(year): (year, path) for year, path in archives[-MAX_ATTACHED_ARCHIVES:]}
+    attached = attached_archives(conn)
+    for name in attached - needed.keys():
+        conn.execute(f'DETACH DATABASE {name}')
+    for name, (year, path) in needed.items():
+        if name not in attached:
+            attach(conn, year, archive_path(conn, path))
+    # UNION ALL без LIMIT внутри: SQLite проталкивает внешние условия в каждую ветку и использует их индексы
+    branches = [f'SELECT {EVENT_COLUMNS} FROM main.events']
+    branches += [f'SELECT {EVENT_COLUMNS} FROM {name}.events' for name in needed]
+    return '(' + ' UNION ALL '.join(branches) + ')'
+
+
+def add_counts(conn, source, where, sign):
+    # Агрегаты отчётов продолжают учитывать архивные события: триггеры удаления/вставки компенсируются здесь
+    conn.execute(f'''
+        INSERT INTO event_daily_counts (student_id, day, category, count)
+        SELECT student_id, date_iso, COALESCE(category, ''), {sign} * COUNT(*) FROM {source}
+        WHERE {where} AND student_id IS NOT NULL AND date_iso IS NOT NULL
+        GROUP BY student_id, date_iso, COALESCE(category, '')
+        ON CONFLICT (student_id, day, category) DO UPDATE SET count = count + excluded.count
+    ''')
+    conn.execute('DELETE FROM event_daily_counts WHERE count <= 0')
+
+
+def register(conn, year, path):
+    name = schema_name(year)
+    conn.execute(f'''
+        INSERT INTO event_archives (academic_year, path, date_from, date_to, events, archived_at)
+        SELECT ?, ?, MIN(date_iso), MAX(date_iso), COUNT(*), ? FROM {name}.events WHERE TRUE
+        ON CONFLICT (academic_year) DO UPDATE SET
+            date_from = excluded.date_from, date_to = excluded.date_to, events = excluded.events,
+            archived_at = excluded.archived_at
+    ''', (year, path, datetime.now().isoformat(timespec='seconds')))
+
+
+def archive_year(conn, year, cutoff, archive_dir=ARCHIVE_DIR):
+    start, end = year_bounds(year)
+    end = min(end, cutoff)
+    relative_path = os.path.join(archive_dir, f'events_{year}_{year + 1}.db')
+    path = archive_path(conn, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    name = schema_name(year)
+    if name in attached_archives(conn):
+        conn.execute(f'DETACH DATABASE {name}')
+    attach(conn, year, path)
+    where = f"date_iso >= '{start}' AND date_iso < '{end}'"
+    try:
+        # В WAL-режиме транзакция над несколькими базами не атомарна, поэтому сначала фиксируем копию в архиве,
+        # а потом удаляем из основной базы; повторный запуск после сбоя доводит перенос до конца
+        with conn:
+            conn.execute(f'INSERT OR REPLACE INTO {name}.events ({EVENT_COLUMNS}) '
+                         f'SELECT {EVENT_COLUMNS} FROM main.events WHERE {where}')
+        with conn:
+            conn.execute('DROP TABLE IF EXISTS temp.archived_counts')
+            conn.execute('CREATE TEMP TABLE archived_counts AS '
+                         f'SELECT student_id, date_iso, category FROM main.events WHERE {where}')
+            moved = conn.execute(f'DELETE FROM main.events WHERE {where}').rowcount
+            add_counts(conn, 'temp.archived_counts', 'TRUE', 1)
+            conn.execute('DROP TABLE temp.archived_counts')
+            register(conn, year, relative_path)
+    finally:
+        conn.execute(f'DETACH DATABASE {name}')
+    return moved
+
+
+def archive_events(conn, cutoff, archive_dir=ARCHIVE_DIR):
+    cutoff = to_iso_date(cutoff)
+    years = [row[0] for row in conn.execute(f'''
+        SELECT DISTINCT {ACADEMIC_YEAR_SQL} FROM events WHERE date_iso < ? ORDER BY 1
+    ''', (cutoff,))]
+    return {year: archive_year(conn, year, cutoff, archive_dir) for year in years}
+
+
+def restore_year(conn, year):
+    row = conn.execute('SELECT path FROM event_archives WHERE academic_year = ?', (year,)).fetchone()
+    if row is None:
+        raise ValueError(f'No archive for academic year {year}')
+    path = archive_path(conn, row[0])
+    name = schema_name(year)
+    if name in attached_archives(conn):
+        conn.execute(f'DETACH DATABASE {name}')
+    attach(conn, year, path)
+    try:
+        with conn:
+            # Сначала снимаем сохранённые при архивации агрегаты: вставка ниже вернёт их через триггеры
+            add_counts(conn, f'{name}.events', 'TRUE', -1)
+            # События удалённых с тех пор студентов вернуть нельзя (внешний ключ), они остаются в архиве
+            restored = conn.execute(f'''
+                INSERT INTO main.events (id, student_id, date, title, description, category)
+                SELECT id, student_id, date, title, description, category FROM {name}.events
+                WHERE student_id IS NULL OR student_id IN (SELECT id FROM main.students)
+            ''').rowcount
+            conn.execute(f'''
+                DELETE FROM {name}.events
+                WHERE student_id IS NULL OR student_id IN (SELECT id FROM main.students)
+            ''')
+            left = conn.execute(f'SELECT COUNT(*) FROM {name}.events').fetchone()[0]
+            if left:
+                add_counts(conn, f'{name}.events', 'TRUE', 1)
+                register(conn, year, row[0])
+            else:
+                conn.execute('DELETE FROM event_archives WHERE academic_year = ?', (year,))
+    finally:
+        conn.execute(f'DETACH DATABASE {name}')
+    if not left:
+        os.remove(path)
+    return restored
+
+
+def compact(conn):
+    archives = conn.execute('SELECT academic_year, path FROM event_archives ORDER BY academic_year').fetchall()
+    for year, path in archives:
+        name = schema_name(year)
+        if name in attached_archives(conn):
+            conn.execute(f'DETACH DATABASE {name}')
+        attach(conn, year, archive_path(conn, path))
+        try:
+            with conn:
+                # Каскадное удаление студентов до архивов не доходит: чистим их события вручную
+                conn.execute(f'DELETE FROM {name}.events WHERE student_id NOT IN (SELECT id FROM main.students)')
+                register(conn, year, path)
+            conn.execute(f'VACUUM {name}')
+        finally:
+            conn.execute(f'DETACH DATABASE {name}')
+    prune_change_log(conn)
+    with conn:
+        conn.execute('DELETE FROM event_daily_counts WHERE student_id NOT IN (SELECT id FROM students)')
+        conn.execute("INSERT INTO events_fts(events_fts) VALUES ('optimize')")
+        conn.execute("INSERT INTO students_fts(students_fts) VALUES ('optimize')")
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Архивация старых событий по учебным годам')
+    parser.add_argument('--database', default=os.environ.get('STUDENT_DATABASE', DATABASE))
+    commands = parser.add_subparsers(dest='command', required=True)
+    archive_parser = commands.add_parser('archive', help='перенести события до даты в архивные базы')
+    archive_parser.add_argument('--before', help='граница (ISO или dd.mm.yyyy); по умолчанию по --keep-years')
+    archive_parser.add_argument('--keep-years', type=int, default=ARCHIVE_KEEP_YEARS)
+    archive_parser.add_argument('--archive-dir', default=os.environ.get('STUDENT_ARCHIVE_DIR', ARCHIVE_DIR))
+    restore_parser = commands.add_parser('restore', help='вернуть учебный год из архива')
+    restore_parser.add_argument('years', nargs='*', type=int, help='год начала учебного года; без аргументов — все')
+    commands.add_parser('compact', help='почистить архивы, VACUUM и ANALYZE')
+    commands.add_parser('list', help='показать архивы')
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    try:
+        migrate(conn)
+        if args.command == 'archive':
+            cutoff = args.before or default_cutoff(args.keep_years)
+            for year, moved in archive_events(conn, cutoff, args.archive_dir).items():
+                print(f'{year}/{year + 1}: archived {moved} events')
+        elif args.command == 'restore':
+            years = args.years or [row[0] for row in conn.execute('SELECT academic_year FROM event_archives')]
+            for year in years:
+                print(f'{year}/{year + 1}: restored {restore_year(conn, year)} events')
+        elif args.command == 'compact':
+            compact(conn)
+        for year, path, date_from, date_to, events in conn.execute('''
+            SELECT academic_year, path, date_from, date_to, events FROM event_archives ORDER BY academic_year
+        '''):
+            print(f'{year}/{year + 1}: {events} events, {date_from} .. {date_to} ({path})')
+    except (ValueError, sqlite3.Error) as e:
+        parser.exit(1, f'error: {e}\n')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
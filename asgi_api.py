@@ -0,0 +1,254 @@
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, jsonify, make_response, request
+
+import batch
+from api import EVENT_FIELDS, STUDENT_FIELDS, fetch_page, parse_fields, parse_page_args
+from db import DATABASE, ConnectionPool, InvalidDateError, current_version, migrate
+
+DB_THREADS = 8
+CHANGE_FEED_INTERVAL = 1.0
+CHANGE_FEED_BATCH = 1000
+SSE_HEARTBEAT = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Database:
+    # sqlite3 синхронный: запросы выполняются в выделенном пуле потоков, event loop не блокируется
+    def __init__(self, pool, threads=DB_THREADS):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='sqlite')
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.call, func, args)
+
+    def call(self, func, args):
+        with self.pool.connection(row_factory=sqlite3.Row) as conn:
+            return func(conn, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+
+def list_rows(conn, table, fields, after_id, limit):
+    return fetch_page(conn.cursor(), table, fields, after_id, limit)
+
+
+def get_row(conn, table, row_id):
+    row = conn.execute(f'SELECT * FROM {table} WHERE id=?', (row_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def insert_row(conn, table, fields, params):
+    with conn:
+        cursor = conn.execute(f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                              params)
+    return cursor.lastrowid
+
+
+def update_row(conn, table, fields, params, row_id):
+    with conn:
+        cursor = conn.execute(f"UPDATE {table} SET {', '.join(f'{field}=?' for field in fields)} WHERE id=?",
+                              params + (row_id,))
+    return cursor.rowcount
+
+
+def delete_row(conn, table, row_id):
+    with conn:
+        return conn.execute(f'DELETE FROM {table} WHERE id=?', (row_id,)).rowcount
+
+
+def fetch_event_changes(conn, since, limit=CHANGE_FEED_BATCH):
+    rows = conn.execute('''
+        SELECT c.version, c.operation, c.row_id, e.student_id, e.date, e.date_iso, e.title, e.description, e.category
+        FROM change_log c LEFT JOIN events e ON e.id = c.row_id
+        WHERE c.version > ? AND c.table_name = 'events'
+        ORDER BY c.version
+        LIMIT ?
+    ''', (since, limit)).fetchall()
+    changes = []
+    for row in rows:
+        data = {'id': row['row_id']}
+        if row['operation'] != 'delete' and row['title'] is not None:
+            data.update({key: row[key] for key in ('student_id', 'date', 'date_iso', 'title', 'description',
+                                                   'category')})
+        changes.append((row['version'], row['operation'], data))
+    return changes
+
+
+class ChangeFeed:
+    # Один опрос change_log на процесс, изменения раздаются всем подписчикам через их очереди
+    def __init__(self, db, interval=CHANGE_FEED_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self.version = 0
+        self.subscribers = set()
+        self.task = None
+
+    async def start(self):
+        self.version = await self.db.run(current_version)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            changes = await self.db.run(fetch_event_changes, self.version)
+            if not changes:
+                continue
+            self.version = changes[-1][0]
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait(changes)
+                except asyncio.QueueFull:
+                    # Медленный клиент отключается и переподключится с Last-Event-ID
+                    self.subscribers.discard(subscriber)
+
+    async def subscribe(self, since):
+        subscriber = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(subscriber)
+        backlog = []
+        up_to = self.version
+        while since < up_to:
+            changes = [change for change in await self.db.run(fetch_event_changes, since) if change[0] <= up_to]
+            if not changes:
+                break
+            backlog.extend(changes)
+            since = changes[-1][0]
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+
+def format_sse(version, operation, data):
+    return f"id: {version}\nevent: {operation}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(config=None):
+    app = Quart(__name__)
+    app.config.update({'DATABASE': DATABASE, 'DB_THREADS': DB_THREADS})
+    app.config.update(config or {})
+
+    pool = ConnectionPool(app.config['DATABASE'], max_size=app.config['DB_THREADS'])
+    with pool.connection() as conn:
+        migrate(conn)
+    db = Database(pool, app.config['DB_THREADS'])
+    feed = ChangeFeed(db)
+
+    @app.before_serving
+    async def start_feed():
+        await feed.start()
+
+    @app.after_serving
+    async def stop_feed():
+        await feed.stop()
+        db.close()
+
+    @app.errorhandler(sqlite3.IntegrityError)
+    async def handle_integrity_error(e):
+        return jsonify({'message': f'Constraint violation: {e}'}), 409
+
+    @app.errorhandler(InvalidDateError)
+    async def handle_invalid_date(e):
+        return jsonify({'message': str(e)}), 400
+
+    async def list_resource(table, allowed_fields):
+        try:
+            fields = parse_fields(request.args, allowed_fields)
+            after_id, limit = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        items, next_cursor = await db.run(list_rows, table, fields, after_id, limit)
+        return jsonify({'items': items, 'next_cursor': next_cursor}), 200
+
+    async def create_resource(table, fields, validate, message):
+        try:
+            params = validate(await request.get_json())
+        except (ValueError, TypeError) as e:
+            return jsonify({'message': str(e)}), 400
+        row_id = await db.run(insert_row, table, fields, params)
+        return jsonify({'message': message, 'id': row_id}), 201
+
+    async def item_resource(table, fields, validate, row_id, name):
+        if request.method == 'GET':
+            row = await db.run(get_row, table, row_id)
+            if row:
+                return jsonify(row), 200
+            return jsonify({'message': f'{name} not found'}), 404
+        if request.method == 'PUT':
+            try:
+                params = validate(await request.get_json())
+            except (ValueError, TypeError) as e:
+                return jsonify({'message': str(e)}), 400
+            if not await db.run(update_row, table, fields, params, row_id):
+                return jsonify({'message': f'{name} not found'}), 404
+            return jsonify({'message': f'{name} updated successfully'}), 200
+        await db.run(delete_row, table, row_id)
+        return jsonify({'message': f'{name} deleted successfully'}), 200
+
+    @app.route('/students', methods=['GET', 'POST'])
+    async def handle_students():
+        if request.method == 'POST':
+            return await create_resource('students', batch.STUDENT_WRITE_FIELDS, batch.validate_student,
+                                         'Student added successfully')
+        return await list_resource('students', STUDENT_FIELDS)
+
+    @app.route('/students/<int:id>', methods=['GET', 'PUT', 'DELETE'])
+    async def handle_student(id):
+        return await item_resource('students', batch.STUDENT_WRITE_FIELDS, batch.validate_student, id, 'Student')
+
+    @app.route('/events', methods=['GET', 'POST'])
+    async def handle_events():
+        if request.method == 'POST':
+            return await create_resource('events', batch.EVENT_WRITE_FIELDS, batch.validate_event,
+                                         'Event added successfully')
+        return await list_resource('events', EVENT_FIELDS)
+
+    @app.route('/events/<int:id>', methods=['GET', 'PUT', 'DELETE'])
+    async def handle_event(id):
+        return await item_resource('events', batch.EVENT_WRITE_FIELDS, batch.validate_event, id, 'Event')
+
+    @app.route('/events/changes', methods=['GET'])
+    async def event_changes():
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        since = int(since) if since and since.isdigit() else feed.version
+        subscriber, backlog = await feed.subscribe(since)
+
+        async def stream():
+            try:
+                last_sent = since
+                for change in backlog:
+                    last_sent = change[0]
+                    yield format_sse(*change)
+                # Отключённый из-за переполнения подписчик дочитывает очередь и завершает поток
+                while subscriber in feed.subscribers or not subscriber.empty():
+                    try:
+                        changes = await asyncio.wait_for(subscriber.get(), timeout=SSE_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        yield ': keep-alive\n\n'
+                        continue
+                    for change in changes:
+                        if change[0] > last_sent:
+                            last_sent = change[0]
+                            yield format_sse(*change)
+            finally:
+                feed.unsubscribe(subscriber)
+
+        response = await make_response(stream(), 200, {'Content-Type': 'text/event-stream',
+                                                       'Cache-Control': 'no-cache'})
+        response.timeout = None
+        return response
+
+    return app
+
+
+if __name__ == '__main__':
+    create_app().run()
@@ -0,0 +1,181 @@
+import sqlite3
+
+from db import to_display_date
+from validation import validate_email, validate_phone
+
+MAX_BATCH_SIZE = 10000
+BATCH_MODES = ('atomic', 'best_effort')
+ID_CHUNK_SIZE = 500
+
+STUDENT_WRITE_FIELDS = ['first_name', 'last_name', 'middle_name', 'birth_date', 'phone', 'email', 'address']
+EVENT_WRITE_FIELDS = ['student_id', 'date', 'title', 'description', 'category']
+
+
+class BatchError(Exception):
+    pass
+
+
+def require(item, fields):
+    if not isinstance(item, dict):
+        raise ValueError('item must be a JSON object')
+    missing = [field for field in fields if item.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+
+
+def validate_student(item):
+    require(item, ['first_name', 'last_name', 'birth_date', 'phone', 'email'])
+    if not validate_email(str(item['email'])):
+        raise ValueError(f"invalid email: {item['email']}")
+    if not validate_phone(str(item['phone'])):
+        raise ValueError(f"invalid phone: {item['phone']}")
+    return (item['first_name'], item['last_name'], item.get('middle_name'), to_display_date(item['birth_date']),
+            str(item['phone']), item['email'], item.get('address'))
+
+
+def validate_event(item):
+    require(item, ['student_id', 'date', 'title'])
+    return (int(item['student_id']), to_display_date(item['date']), item['title'], item.get('description'),
+            item.get('category'))
+
+
+def item_id(item):
+    value = item.get('id') if isinstance(item, dict) else item
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError('id must be an integer')
+    return value
+
+
+def existing_ids(conn, table, ids):
+    found = set()
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[start:start + ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        found.update(row[0] for row in conn.execute(f'SELECT id FROM {table} WHERE id IN ({placeholders})', chunk))
+    return found
+
+
+def batch_sql(operation, table, fields):
+    if operation == 'create':
+        return f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})"
+    if operation == 'update':
+        return f"UPDATE {table} SET {', '.join(f'{field}=?' for field in fields)} WHERE id=?"
+    return f'DELETE FROM {table} WHERE id=?'
+
+
+def prepare_item(operation, item, validate):
+    if operation == 'create':
+        return None, validate(item)
+    row_id = item_id(item)
+    if operation == 'update':
+        return row_id, validate(item) + (row_id,)
+    return row_id, (row_id,)
+
+
+def has_errors(results):
+    return any(result['status'] == 'error' for result in results)
+
+
+def skip_pending(results):
+    for result in results:
+        if result['status'] == 'pending':
+            result['status'] = 'skipped'
+    return results
+
+
+def run_batch(conn, operation, table, fields, validate, items, mode='atomic'):
+    if mode not in BATCH_MODES:
+        raise BatchError(f'Unknown batch mode: {mode}')
+    if not isinstance(items, list):
+        raise BatchError('Expected a JSON array')
+    if len(items) > MAX_BATCH_SIZE:
+        raise BatchError(f'Batch is limited to {MAX_BATCH_SIZE} items')
+
+    results = [{'index': index, 'status': 'pending'} for index in range(len(items))]
+    prepared = []
+    for index, item in enumerate(items):
+        try:
+            row_id, params = prepare_item(operation, item, validate)
+        except (ValueError, TypeError) as e:
+            results[index].update(status='error', message=str(e))
+            continue
+        results[index]['id'] = row_id
+        prepared.append((index, params))
+
+    if mode == 'atomic' and has_errors(results):
+        return False, skip_pending(results)
+
+    sql = batch_sql(operation, table, fields)
+    status = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}[operation]
+    # Один BEGIN IMMEDIATE/COMMIT на весь пакет: одна синхронизация журнала вместо одной на запись
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if operation != 'create':
+            # Проверка под блокировкой записи: строку не удалят между проверкой и изменением
+            found = existing_ids(conn, table, [results[index]['id'] for index, _ in prepared])
+            for index, _ in prepared:
+                if results[index]['id'] not in found:
+                    results[index].update(status='error', message='not found')
+            prepared = [(index, params) for index, params in prepared if results[index]['id'] in found]
+            if mode == 'atomic' and has_errors(results):
+                conn.rollback()
+                return False, skip_pending(results)
+        if mode == 'atomic':
+            apply_atomic(conn, operation, table, sql, prepared, results, status)
+        else:
+            apply_best_effort(conn, operation, sql, prepared, results, status)
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        if mode != 'atomic':
+            raise
+        locate_failures(conn, operation, sql, prepared, results)
+        return False, results
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return True, results
+
+
+def apply_atomic(conn, operation, table, sql, prepared, results, status):
+    conn.executemany(sql, [params for _, params in prepared])
+    if operation == 'create' and prepared:
+        # executemany не отдаёт lastrowid; при AUTOINCREMENT под блокировкой записи id идут подряд
+        last_id = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()[0]
+        first_id = last_id - len(prepared) + 1
+        for offset, (index, _) in enumerate(prepared):
+            results[index]['id'] = first_id + offset
+    for index, _ in prepared:
+        results[index]['status'] = status
+
+
+def apply_best_effort(conn, operation, sql, prepared, results, status):
+    for index, params in prepared:
+        conn.execute('SAVEPOINT batch_item')
+        try:
+            cursor = conn.execute(sql, params)
+        except sqlite3.IntegrityError as e:
+            conn.execute('ROLLBACK TO batch_item')
+            conn.execute('RELEASE batch_item')
+            results[index].update(status='error', message=str(e))
+            continue
+        conn.execute('RELEASE batch_item')
+        if operation == 'create':
+            results[index]['id'] = cursor.lastrowid
+        results[index]['status'] = status
+
+
+def locate_failures(conn, operation, sql, prepared, results):
+    # executemany не говорит, на каком элементе сработало ограничение (внешний ключ, уникальность): прогоняем
+    # пакет по одной записи в savepoint'ах, отмечаем виновные элементы и откатываем всё
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        apply_best_effort(conn, operation, sql, prepared, results, 'pending')
+    finally:
+        conn.rollback()
+    for index, _ in prepared:
+        result = results[index]
+        if result['status'] != 'error':
+            result['status'] = 'skipped'
+        if operation == 'create':
+            result['id'] = None
@@ -0,0 +1,387 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from flask.json.provider import DefaultJSONProvider
+from openpyxl import Workbook
+
+import api
+import negotiation
+import reports
+import search
+from benchmarks.seed import seed
+from db import ConnectionPool
+from student_management import StudentManagementSystem
+
+BENCH_REPEAT = 20
+# Экспорт всей таблицы, импорт файла и т. п. гоняются меньшее число раз
+BENCH_HEAVY_REPEAT = 3
+IMPORT_ROWS = 1000
+# Размер страницы для сравнения сериализаторов и форматов ответа
+SERIALIZE_ROWS = 1000
+# Отклонение p50 от базового прогона, после которого кейс считается регрессией
+REGRESSION_THRESHOLD = 1.2
+
+
+class HeadlessTreeview:
+    # Минимум интерфейса ttk.Treeview, которым пользуются StudentManagementSystem и LazyTreeview
+    def __init__(self):
+        self.rows = {}
+        self.v_scrollbar = None
+
+    def configure(self, **options):
+        pass
+
+    def after_idle(self, func):
+        func()
+
+    def bind(self, sequence, func):
+        pass
+
+    def get_children(self):
+        return list(self.rows)
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.rows.pop(iid, None)
+
+    def insert(self, parent, index, iid=None, values=()):
+        self.rows[iid] = values
+        return iid
+
+    def exists(self, iid):
+        return iid in self.rows
+
+    def item(self, iid, values=None):
+        self.rows[iid] = values
+
+
+class NoopTask:
+    def progress(self, done, total=None):
+        pass
+
+
+class HeadlessApp(StudentManagementSystem):
+    # Методы главного окна без Tk: те же запросы и та же работа с данными, таблицы — в памяти
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = pool.acquire()
+        self.cursor = self.conn.cursor()
+        self.create_row_stores()
+        self.tab_students = self.tab_events = self.tab_groups = None
+        self.create_student_widgets()
+        self.create_event_widgets()
+        self.create_group_widgets()
+
+    def create_treeview(self, parent, columns):
+        return HeadlessTreeview()
+
+    def close(self):
+        self.pool.release(self.conn)
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def measure(func, repeat, setup=None, teardown=None):
+    # setup готовит данные для одного вызова (например, строку для удаления) и в замер не входит
+    def run_once():
+        state = setup() if setup is not None else None
+        started = time.perf_counter()
+        if setup is None:
+            func()
+        else:
+            func(state)
+        elapsed = time.perf_counter() - started
+        if teardown is not None:
+            teardown()
+        return elapsed
+
+    run_once()
+    timings = [run_once() for _ in range(repeat)]
+    # Пиковая память снимается отдельным прогоном: tracemalloc заметно замедляет код
+    tracemalloc.start()
+    try:
+        run_once()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'repeat': repeat,
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'ops_per_s': round(len(timings) / sum(timings), 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def write_import_file(path, rows):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['Фамилия', 'Имя', 'Отчество', 'Дата рождения', 'Телефон', 'Email', 'Адрес', 'Группа'])
+    for number in range(rows):
+        sheet.append(['Импортов', 'Иван', 'Иванович', '01.09.2003', f'+78{number:09d}', f'import{number}@bench.test',
+                      'ул. Ленина, д. 1', ''])
+    workbook.save(path)
+
+
+def gui_cases(app, workdir, import_rows):
+    conn = app.conn
+    group_name = conn.execute('SELECT group_name FROM groups ORDER BY id LIMIT 1').fetchone()[0]
+    date_from, date_to = conn.execute('SELECT MIN(date_iso), MAX(date_iso) FROM events').fetchone()
+    import_path = os.path.join(workdir, 'import.xlsx')
+    write_import_file(import_path, import_rows)
+    app.load_data()
+
+    def remove_imported():
+        with conn:
+            conn.execute("DELETE FROM students WHERE email LIKE 'import%@bench.test'")
+
+    return [
+        ('gui.load_data', app.load_data, {'heavy': True}),
+        ('gui.students_page', lambda: app.students_view.reload(), {}),
+        ('gui.search_in_treeview', lambda: app.search_in_treeview('иван', app.students, app.tree_students), {}),
+        ('gui.search_students_fts', lambda: search.search_students(conn, 'иван'), {}),
+        ('gui.import_data', lambda: app.run_import(conn, NoopTask(), import_path),
+         {'heavy': True, 'teardown': remove_imported, 'rows': import_rows}),
+        ('gui.write_excel', lambda: app.write_export(conn, NoopTask(), os.path.join(workdir, 'export.xlsx'), 'xlsx'),
+         {'heavy': True}),
+        ('gui.create_group_report', lambda: reports.summary(conn, group_name, date_from, date_to), {}),
+    ]
+
+
+def api_cases(app, conn, warm_cache):
+    client = app.test_client()
+    response_cache = app.extensions['response_cache']
+    student_id = conn.execute('SELECT MAX(id) / 2 FROM students').fetchone()[0]
+    event_id = conn.execute('SELECT MAX(id) / 2 FROM events').fetchone()[0]
+    group_name = conn.execute('SELECT group_name FROM groups ORDER BY id LIMIT 1').fetchone()[0]
+    student = dict(zip(['first_name', 'last_name', 'middle_name', 'birth_date', 'phone', 'email', 'address'],
+                       conn.execute('''
+                           SELECT first_name, last_name, middle_name, birth_date, phone, email, address
+                           FROM students WHERE id = ?
+                       ''', (student_id,)).fetchone()))
+    event = {'student_id': student_id, 'date': '01.10.2023', 'title': 'Бенчмарк', 'description': 'Запись бенчмарка',
+             'category': 'Учёба'}
+    counter = itertools.count()
+
+    def new_student():
+        number = next(counter)
+        return dict(student, phone=f'+77{number:09d}', email=f'api{number}@bench.test')
+
+    def request(method, path, body=None, headers=None):
+        def call():
+            if not warm_cache:
+                response_cache.clear()
+            payload = body() if callable(body) else body
+            response = client.open(path, method=method, json=payload, headers=headers)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{method} {path}: {response.status_code} {response.get_data(as_text=True)}')
+            return response.get_data()
+        return call
+
+    def sized(call, options=None):
+        # Размер тела ответа (после сжатия) снимается одним дополнительным вызовом
+        return dict(options or {}, size=lambda: len(call()))
+
+    gzip = {'Accept-Encoding': 'gzip'}
+
+    def create_event():
+        with conn:
+            return conn.execute('''
+                INSERT INTO events (student_id, date, title, description, category) VALUES (?, ?, ?, ?, ?)
+            ''', (student_id, '01.10.2023', 'Бенчмарк', 'Запись бенчмарка', 'Учёба')).lastrowid
+
+    def delete_event(created_id):
+        request('DELETE', f'/events/{created_id}')()
+
+    def remove_created():
+        with conn:
+            conn.execute("DELETE FROM students WHERE email LIKE 'api%@bench.test'")
+            conn.execute("DELETE FROM events WHERE title = 'Бенчмарк'")
+
+    return [
+        ('api.GET /students', request('GET', '/students'), {}),
+        ('api.GET /students?limit=1000', request('GET', '/students?limit=1000'),
+         sized(request('GET', '/students?limit=1000'))),
+        ('api.GET /students?limit=1000 gzip', request('GET', '/students?limit=1000', headers=gzip),
+         sized(request('GET', '/students?limit=1000', headers=gzip))),
+        ('api.GET /students?limit=1000&format=columns', request('GET', '/students?limit=1000&format=columns'),
+         sized(request('GET', '/students?limit=1000&format=columns'))),
+        ('api.GET /students?limit=1000&format=columns gzip',
+         request('GET', '/students?limit=1000&format=columns', headers=gzip),
+         sized(request('GET', '/students?limit=1000&format=columns', headers=gzip))),
+        ('api.GET /students/<id>', request('GET', f'/students/{student_id}'), {}),
+        ('api.POST /students', request('POST', '/students', new_student), {'teardown': remove_created}),
+        ('api.PUT /students/<id>', request('PUT', f'/students/{student_id}', student), {}),
+        ('api.GET /events', request('GET', '/events'), {}),
+        ('api.GET /events?limit=1000', request('GET', '/events?limit=1000'),
+         sized(request('GET', '/events?limit=1000'))),
+        ('api.GET /events?limit=1000 gzip', request('GET', '/events?limit=1000', headers=gzip),
+         sized(request('GET', '/events?limit=1000', headers=gzip))),
+        ('api.GET /events/<id>', request('GET', f'/events/{event_id}'), {}),
+        ('api.POST /events', request('POST', '/events', event), {'teardown': remove_created}),
+        ('api.PUT /events/<id>', request('PUT', f'/events/{event_id}', dict(event, title='Бенчмарк (изменено)')), {}),
+        ('api.DELETE /events/<id>', delete_event, {'setup': create_event}),
+        ('api.POST /students/batch', request('POST', '/students/batch', lambda: [new_student() for _ in range(100)]),
+         {'teardown': remove_created, 'rows': 100}),
+        ('api.POST /events/batch', request('POST', '/events/batch', [event] * 100),
+         {'teardown': remove_created, 'rows': 100}),
+        ('api.GET /search', request('GET', '/search?q=Иванов'), {}),
+        ('api.GET /reports/groups/<name>', request('GET', f'/reports/groups/{group_name}?granularity=month'), {}),
+        ('api.GET /reports/faculty', request('GET', '/reports/faculty'), {}),
+        ('api.GET /export?format=csv', request('GET', '/export?format=csv'), {'heavy': True}),
+        ('api.GET /export?format=csv gzip', request('GET', '/export?format=csv', headers=gzip), {'heavy': True}),
+        ('api.GET /api/students/<id>/events', request('GET', f'/api/students/{student_id}/events'), {}),
+        ('api.GET /api/groups', request('GET', '/api/groups'), {}),
+        ('api.GET /api/students', request('GET', '/api/students'), {'heavy': True}),
+        ('api.GET /api/students gzip', request('GET', '/api/students', headers=gzip), {'heavy': True}),
+    ] + ([
+        ('api.GET /students?limit=1000 msgpack',
+         request('GET', '/students?limit=1000', headers={'Accept': negotiation.MSGPACK_MIMETYPE}),
+         sized(request('GET', '/students?limit=1000', headers={'Accept': negotiation.MSGPACK_MIMETYPE}))),
+    ] if negotiation.msgpack is not None else [])
+
+
+def serialization_cases(app, conn, rows=SERIALIZE_ROWS):
+    # Сериализация одной страницы без HTTP: прежний путь jsonify([dict(ix) ...]) против провайдера приложения
+    # (orjson, если установлен), формата columns, MessagePack и сжатия
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    page = cursor.execute(f'SELECT {", ".join(api.STUDENT_FIELDS)} FROM students ORDER BY id LIMIT ?',
+                          (rows,)).fetchall()
+    baseline = DefaultJSONProvider(app)
+
+    def case(name, encode):
+        return name, encode, {'size': lambda: len(encode())}
+
+    def dicts(provider):
+        return lambda: provider.response({'items': [dict(ix) for ix in page]}).get_data()
+
+    def columns(provider):
+        return lambda: provider.response(negotiation.columnar_rows(api.STUDENT_FIELDS, page)).get_data()
+
+    def gzipped(encode):
+        return lambda: negotiation.compress_bytes(encode(), 'gzip')
+
+    cases = [
+        case('serialize.jsonify_dicts (baseline)', dicts(baseline)),
+        case('serialize.app_json_dicts', dicts(app.json)),
+        case('serialize.app_json_columns', columns(app.json)),
+        case('serialize.app_json_dicts gzip', gzipped(dicts(app.json))),
+        case('serialize.app_json_columns gzip', gzipped(columns(app.json))),
+        case('serialize.app_json_dicts deflate',
+             lambda: negotiation.compress_bytes(dicts(app.json)(), 'deflate')),
+    ]
+    if negotiation.msgpack is not None:
+        cases += [
+            case('serialize.msgpack_dicts',
+                 lambda: negotiation.msgpack.packb({'items': [dict(ix) for ix in page]}, use_bin_type=True)),
+            case('serialize.msgpack_columns',
+                 lambda: negotiation.msgpack.packb(negotiation.columnar_rows(api.STUDENT_FIELDS, page),
+                                                   use_bin_type=True)),
+        ]
+    return cases
+
+
+def dataset(conn):
+    return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('students', 'events', 'groups', 'education_periods')}
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['cases']
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        ratio = stats['p50_ms'] / max(baseline[name]['p50_ms'], 1e-6)
+        stats['baseline_p50_ms'] = baseline[name]['p50_ms']
+        stats['ratio'] = round(ratio, 3)
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк горячих путей интерфейса и API')
+    parser.add_argument('--database', help='готовая база (копируется во временный каталог); по умолчанию генерируется')
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--events-per-student', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=BENCH_REPEAT)
+    parser.add_argument('--heavy-repeat', type=int, default=BENCH_HEAVY_REPEAT)
+    parser.add_argument('--import-rows', type=int, default=IMPORT_ROWS)
+    parser.add_argument('--only', help='запускать только кейсы, имя которых содержит эту строку')
+    parser.add_argument('--warm-cache', action='store_true', help='не сбрасывать кэш ответов API между запросами')
+    parser.add_argument('--output', help='JSON-файл с результатами')
+    parser.add_argument('--baseline', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='student-bench-') as workdir:
+        database = os.path.join(workdir, 'bench.db')
+        if args.database:
+            shutil.copyfile(args.database, database)
+        else:
+            seed(database, args.students, args.events_per_student)
+
+        pool = ConnectionPool(database)
+        gui_app = HeadlessApp(pool)
+        api_app = api.create_app({'DATABASE': database})
+        cases = (gui_cases(gui_app, workdir, args.import_rows) + api_cases(api_app, gui_app.conn, args.warm_cache)
+                 + serialization_cases(api_app, gui_app.conn))
+
+        results = {}
+        for name, func, options in cases:
+            if args.only and args.only not in name:
+                continue
+            repeat = args.heavy_repeat if options.get('heavy') else args.repeat
+            stats = measure(func, repeat, setup=options.get('setup'), teardown=options.get('teardown'))
+            if 'rows' in options:
+                stats['rows_per_s'] = round(options['rows'] * stats['ops_per_s'], 1)
+            if 'size' in options:
+                stats['response_bytes'] = options['size']()
+            results[name] = stats
+            print(f"{name:40} p50 {stats['p50_ms']:>10.2f} ms  p95 {stats['p95_ms']:>10.2f} ms  "
+                  f"{stats['ops_per_s']:>9.1f} op/s  peak {stats['peak_memory_kb']:>10.1f} KB"
+                  + (f"  {stats['response_bytes']:>9} B" if 'size' in options else ''), flush=True)
+
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'dataset': dataset(gui_app.conn),
+            'cases': results,
+        }
+        gui_app.close()
+        pool.close()
+        api_app.extensions['db_pool'].close()
+        if 'snapshot' in api_app.extensions:
+            api_app.extensions['snapshot'].stop()
+
+    regressions = compare(results, args.baseline) if args.baseline else []
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    for name in regressions:
+        stats = results[name]
+        print(f"REGRESSION {name}: p50 {stats['baseline_p50_ms']} -> {stats['p50_ms']} ms (x{stats['ratio']})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from db import create_base_schema, migrate
+
+SEED_BATCH_SIZE = 50000
+
+LAST_NAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов', 'Новиков',
+              'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров', 'Павлов', 'Козлов',
+              'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин', 'Захаров']
+MALE_NAMES = ['Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артём', 'Илья', 'Кирилл', 'Михаил']
+FEMALE_NAMES = ['Анна', 'Мария', 'Елена', 'Дарья', 'Алина', 'Ирина', 'Екатерина', 'Ольга', 'Полина', 'Татьяна']
+MIDDLE_NAMES = ['Александров', 'Дмитриев', 'Сергеев', 'Андреев', 'Алексеев', 'Михайлов', 'Игорев', 'Олегов',
+                'Владимиров', 'Николаев']
+STREETS = ['Ленина', 'Пушкина', 'Гагарина', 'Мира', 'Советская', 'Садовая', 'Лесная', 'Школьная', 'Молодёжная']
+CATEGORIES = ['Учёба', 'Спорт', 'Наука', 'Культура', 'Общественная работа', 'Дисциплина']
+TITLES = {
+    'Учёба': ['Сдача сессии', 'Пересдача экзамена', 'Курсовая работа', 'Практика'],
+    'Спорт': ['Соревнования по волейболу', 'Легкоатлетический кросс', 'Турнир по шахматам'],
+    'Наука': ['Доклад на конференции', 'Публикация статьи', 'Олимпиада по программированию'],
+    'Культура': ['Студенческая весна', 'Концерт', 'Театральная постановка'],
+    'Общественная работа': ['Субботник', 'Волонтёрство', 'Работа в студсовете'],
+    'Дисциплина': ['Пропуск занятий', 'Замечание куратора', 'Благодарность деканата'],
+}
+FACULTY_CODES = ['ИВТ', 'ПИ', 'ИСТ', 'ПМИ', 'КБ', 'БИ']
+
+
+def group_names(count):
+    names = []
+    for number in range(count):
+        code = FACULTY_CODES[number % len(FACULTY_CODES)]
+        names.append(f'{code}-{20 + number // len(FACULTY_CODES) % 6}{number // 36 + 1}')
+    return names
+
+
+def random_date(rng, start, days):
+    return (start + timedelta(days=rng.randrange(days))).strftime('%d.%m.%Y')
+
+
+def generate_students(rng, count, group_count):
+    for number in range(1, count + 1):
+        if rng.random() < 0.5:
+            last_name, first_name = rng.choice(LAST_NAMES), rng.choice(MALE_NAMES)
+            middle_name = rng.choice(MIDDLE_NAMES) + 'ич'
+        else:
+            last_name, first_name = rng.choice(LAST_NAMES) + 'а', rng.choice(FEMALE_NAMES)
+            middle_name = rng.choice(MIDDLE_NAMES) + 'на'
+        # Телефон и email строятся из номера студента, чтобы не нарушать уникальные индексы
+        phone = f'+79{number:09d}'
+        email = f'student{number}@example.edu'
+        address = f'ул. {rng.choice(STREETS)}, д. {rng.randint(1, 120)}, кв. {rng.randint(1, 300)}'
+        group_id = rng.randint(1, group_count) if group_count else None
+        yield (first_name, last_name, middle_name, random_date(rng, date(1995, 1, 1), 365 * 10), phone, email,
+               address, group_id)
+
+
+def generate_events(rng, student_count, events_per_student):
+    for _ in range(student_count * events_per_student):
+        category = rng.choice(CATEGORIES)
+        title = rng.choice(TITLES[category])
+        yield (rng.randint(1, student_count), random_date(rng, date(2018, 9, 1), 365 * 6), title,
+               f'{title}: запись №{rng.randint(1, 10 ** 6)}', category)
+
+
+def generate_periods(rng, student_count, groups):
+    for student_id in range(1, student_count + 1):
+        start = date(2018, 9, 1) + timedelta(days=365 * rng.randrange(4))
+        end = start + timedelta(days=365 * rng.randint(1, 4))
+        yield student_id, start.strftime('%d.%m.%Y'), end.strftime('%d.%m.%Y'), rng.choice(groups)
+
+
+def insert_all(conn, sql, rows, batch_size=SEED_BATCH_SIZE):
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return total
+        with conn:
+            conn.executemany(sql, batch)
+        total += len(batch)
+
+
+def seed(path, students=10000, events_per_student=10, groups=60, random_seed=1):
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(random_seed)
+    conn = sqlite3.connect(path)
+    try:
+        # Данные заливаются в базовую схему до триггеров; индексы, FTS и агрегаты строят миграции разом
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        create_base_schema(conn)
+        conn.execute('PRAGMA user_version = 1')
+        names = group_names(groups)
+        counts = {
+            'groups': insert_all(conn, 'INSERT INTO groups (group_name) VALUES (?)', ((name,) for name in names)),
+            'students': insert_all(conn, '''
+                INSERT INTO students (first_name, last_name, middle_name, birth_date, phone, email, address, group_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', generate_students(rng, students, groups)),
+            'education_periods': insert_all(conn, '''
+                INSERT INTO education_periods (student_id, start_date, end_date, group_name) VALUES (?, ?, ?, ?)
+            ''', generate_periods(rng, students, names or [''])),
+            'events': insert_all(conn, '''
+                INSERT INTO events (student_id, date, title, description, category) VALUES (?, ?, ?, ?, ?)
+            ''', generate_events(rng, students, events_per_student)),
+        }
+        migrate(conn)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация синтетической базы студентов для бенчмарков')
+    parser.add_argument('path', help='файл новой базы (не должен существовать)')
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--events-per-student', type=int, default=10)
+    parser.add_argument('--groups', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = seed(args.path, args.students, args.events_per_student, args.groups, args.seed)
+    elapsed = time.perf_counter() - started
+    print(', '.join(f'{table}: {count}' for table, count in counts.items()) + f' ({elapsed:.1f} s)')
+
+
+if __name__ == '__main__':
+    main()
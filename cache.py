@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, current_app, g, jsonify, make_response, request
+
+from db import current_version, get_db
+from streaming import wants_stream
+
+CACHE_MAX_ENTRIES = 256
+# Записи в других процессах (десктоп, другой сервер) кэш не видит, TTL ограничивает такую устарелость, с
+CACHE_TTL = 10
+# Сколько последних версий change_log помнит кэш для Last-Modified
+CACHE_MAX_VERSIONS = 64
+
+
+class CacheEntry:
+    __slots__ = ('body', 'mimetype', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, body, mimetype, etag, last_modified, expires_at):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.versions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def make_key(self):
+        return request.path, tuple(sorted(request.args.items(multi=True))), request.headers.get('Accept', '')
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def modified_at(self, version):
+        # Last-Modified двигается только вместе с данными: это момент, когда кэш впервые увидел данную версию
+        # change_log, а не время кэширования. Отстающая реплика может принести более старую версию уже после
+        # новой — её время не должно оказаться позже времени новой версии
+        with self.lock:
+            stamp = self.versions.get(version)
+            if stamp is None:
+                later = [known for known_version, known in self.versions.items() if known_version > version]
+                stamp = min(later) if later else datetime.now(timezone.utc).replace(microsecond=0)
+                self.versions[version] = stamp
+                while len(self.versions) > CACHE_MAX_VERSIONS:
+                    self.versions.popitem(last=False)
+            return stamp
+
+    def put(self, key, response, version):
+        response.add_etag()
+        etag, _ = response.get_etag()
+        entry = CacheEntry(response.get_data(), response.mimetype, etag, self.modified_at(version),
+                           time.monotonic() + self.ttl)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *prefixes, arg=None):
+        # arg: сбрасывать только ответы, запрошенные с этим параметром (например, include)
+        with self.lock:
+            for key in [key for key in self.entries if key[0].startswith(prefixes)
+                        and (arg is None or any(name == arg for name, _ in key[1]))]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                    'not_modified': self.not_modified}
+
+
+def build_response(cache, entry, cache_status):
+    response = Response(entry.body, mimetype=entry.mimetype)
+    response.set_etag(entry.etag)
+    # Точность Last-Modified — секунда; изменения внутри одной секунды различает ETag, он проверяется первым
+    response.last_modified = entry.last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Cache'] = cache_status
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        with cache.lock:
+            cache.not_modified += 1
+    return response
+
+
+def cached(response_cache=None):
+    # Без явного кэша берётся тот, что подключён к приложению через init_app (для blueprint'ов)
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or wants_stream():
+                return view(*args, **kwargs)
+            cache = response_cache or current_app.extensions['response_cache']
+            key = cache.make_key()
+            entry = cache.get(key)
+            if entry is not None:
+                # Попадание в кэш: ни SQL, ни сериализации, при совпадении ETag — сразу 304
+                return build_response(cache, entry, 'HIT')
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            # Версию берём из того соединения, которое строило ответ: у реплики она своя
+            version = current_version(g.get('snapshot_db') or get_db())
+            return build_response(cache, cache.put(key, response, version), 'MISS')
+        return wrapper
+    return decorator
+
+
+def invalidate_resource(cache, resource):
+    # /api/* (desktop_api) отдаёт те же таблицы целиком и подключён к тому же приложению
+    cache.invalidate(resource, '/search', '/reports', '/api')
+    if resource == '/events':
+        # /students?include=events собирается из событий, остальные ответы /students от них не зависят
+        cache.invalidate('/students', arg='include')
+
+
+def init_app(app, cache):
+    app.extensions['response_cache'] = cache
+
+    @app.after_request
+    def invalidate_on_write(response):
+        if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+            # /students/5 -> сбрасываем /students* и всё, что собирается из этих данных
+            invalidate_resource(cache, '/' + request.path.strip('/').split('/')[0])
+        return response
+
+    @app.route('/cache/stats', methods=['GET'])
+    def cache_stats():
+        return jsonify(cache.stats()), 200
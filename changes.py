@@ -0,0 +1,41 @@
+from db import current_version
+
+# Если за один опрос изменилось больше строк, дешевле перечитать таблицу целиком
+BULK_THRESHOLD = 500
+
+
+class ChangeTracker:
+    def __init__(self, conn):
+        self.conn = conn
+        self.version = current_version(conn)
+        self.listeners = {}
+        self.change_listeners = []
+
+    def subscribe(self, table, on_rows, on_reload):
+        self.listeners[table] = (on_rows, on_reload)
+
+    def subscribe_all(self, on_change):
+        self.change_listeners.append(on_change)
+
+    def poll(self):
+        changes = self.conn.execute('''
+            SELECT version, table_name, row_id FROM change_log WHERE version > ? ORDER BY version
+        ''', (self.version,)).fetchall()
+        if not changes:
+            return
+        self.version = changes[-1][0]
+        for on_change in self.change_listeners:
+            on_change()
+
+        changed = {}
+        for _, table, row_id in changes:
+            # dict сохраняет порядок и схлопывает повторные изменения одной строки
+            changed.setdefault(table, {})[row_id] = None
+        for table, row_ids in changed.items():
+            if table not in self.listeners:
+                continue
+            on_rows, on_reload = self.listeners[table]
+            if len(row_ids) > BULK_THRESHOLD:
+                on_reload()
+            else:
+                on_rows(list(row_ids))
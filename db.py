@@ -0,0 +1,396 @@
+import logging
+import queue
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from flask import current_app, g
+
+logger = logging.getLogger(__name__)
+
+# В интерфейсе даты вводятся как dd.MM.yyyy (DateEntry), в базе для сравнений хранится ISO-копия
+DISPLAY_DATE_FORMAT = '%d.%m.%Y'
+ISO_DATE_FORMAT = '%Y-%m-%d'
+
+DATABASE = 'student_management.db'
+POOL_SIZE = 8
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -20000',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA foreign_keys = ON',
+)
+
+
+class InvalidDateError(ValueError):
+    pass
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()[:10]
+    for date_format in (DISPLAY_DATE_FORMAT, ISO_DATE_FORMAT):
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise InvalidDateError(f'Unrecognized date: {value!r}')
+
+
+def to_iso_date(value):
+    return parse_date(value).strftime(ISO_DATE_FORMAT)
+
+
+def to_display_date(value):
+    return parse_date(value).strftime(DISPLAY_DATE_FORMAT)
+
+
+def iso_date_sql(column):
+    return f'''
+        CASE
+            WHEN {column} GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]'
+                THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2)
+            WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'
+                THEN substr({column}, 1, 10)
+        END
+    '''
+
+
+def connect(database=DATABASE, factory=sqlite3.Connection, read_only=False):
+    # Соединение переходит между потоками только через пул, поэтому проверка потока не нужна
+    conn = sqlite3.connect(database, check_same_thread=False, factory=factory)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def detach_all(conn):
+    # Подключённые на время запроса базы (архивы событий, archive.py) не переживают возврат соединения в пул:
+    # иначе файл архива остаётся открытым, и restore/compact не могут его удалить или перезаписать
+    for name in [row[1] for row in conn.execute('PRAGMA database_list') if row[1] not in ('main', 'temp')]:
+        conn.execute(f'DETACH DATABASE {name}')
+
+
+class ConnectionPool:
+    def __init__(self, database=DATABASE, max_size=POOL_SIZE, factory=sqlite3.Connection, read_only=False):
+        self.database = database
+        self.factory = factory
+        self.read_only = read_only
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.database, self.factory, self.read_only)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        try:
+            detach_all(conn)
+        except sqlite3.OperationalError:
+            # Подключённую базу держит незавершённый запрос: такое соединение в пул не возвращаем
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self, row_factory=None):
+        conn = self.acquire()
+        conn.row_factory = row_factory
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def create_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT, last_name TEXT, middle_name TEXT, birth_date TEXT,
+            phone TEXT, email TEXT, address TEXT, group_id INTEGER,
+            FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE SET NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER, date TEXT, title TEXT, description TEXT, category TEXT,
+            FOREIGN KEY(student_id) REFERENCES students(id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS education_periods (
+            student_id INTEGER, start_date TEXT, end_date TEXT, group_name TEXT,
+            FOREIGN KEY(student_id) REFERENCES students(id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, group_name TEXT
+        )
+    ''')
+
+
+def create_unique_index(conn, name, table, column):
+    duplicate = conn.execute(f'''
+        SELECT {column} FROM {table} WHERE {column} IS NOT NULL GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 1
+    ''').fetchone()
+    if duplicate:
+        # Старые базы могли накопить дубликаты до появления проверок; данные не трогаем
+        logger.warning("%s.%s has duplicate values (%r), creating a non-unique index", table, column, duplicate[0])
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table}({column})')
+    else:
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table}({column})')
+
+
+def add_lookup_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_student_id ON events(student_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_date ON events(date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_education_periods_student_id ON education_periods(student_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_students_group_id ON students(group_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_groups_group_name ON groups(group_name)')
+    create_unique_index(conn, 'idx_students_email', 'students', 'email')
+    create_unique_index(conn, 'idx_students_phone', 'students', 'phone')
+
+
+def add_iso_dates(conn):
+    for table, column in (('events', 'date'), ('students', 'birth_date')):
+        iso_column = f'{column}_iso'
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {iso_column} TEXT')
+        conn.execute(f'UPDATE {table} SET {iso_column} = {iso_date_sql(column)}')
+        # Триггеры держат ISO-копию в актуальном состоянии для любого пишущего кода
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{iso_column}_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE {table} SET {iso_column} = {iso_date_sql(f'NEW.{column}')} WHERE id = NEW.id;
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{iso_column}_update AFTER UPDATE OF {column} ON {table}
+            BEGIN
+                UPDATE {table} SET {iso_column} = {iso_date_sql(f'NEW.{column}')} WHERE id = NEW.id;
+            END
+        ''')
+    conn.execute('DROP INDEX IF EXISTS idx_events_date')
+    conn.execute('DROP INDEX IF EXISTS idx_events_student_id')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_date_iso ON events(date_iso)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_student_date ON events(student_id, date_iso)')
+
+
+TRACKED_TABLES = ('students', 'events', 'groups')
+CHANGE_LOG_RETENTION = 100000
+# API подрезает журнал раз в столько успешных запросов на запись
+CHANGE_LOG_PRUNE_EVERY = 1000
+
+
+def add_change_log(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL, row_id INTEGER NOT NULL, operation TEXT NOT NULL
+        )
+    ''')
+    for table in TRACKED_TABLES:
+        # *_iso заполняются триггерами; их обновление не должно порождать вторую запись в журнале
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')
+                   if row[1] != 'id' and not row[1].endswith('_iso')]
+        for operation, event, ref in (('insert', 'INSERT', 'NEW'),
+                                      ('update', f'UPDATE OF {", ".join(columns)}', 'NEW'),
+                                      ('delete', 'DELETE', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_log_{operation} AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table}', {ref}.id, '{operation}');
+                END
+            ''')
+
+
+def current_version(conn):
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM change_log').fetchone()[0]
+
+
+def prune_change_log(conn, keep=CHANGE_LOG_RETENTION):
+    with conn:
+        conn.execute('DELETE FROM change_log WHERE version <= ?', (current_version(conn) - keep,))
+
+
+FTS_TABLES = {
+    'students': ['last_name', 'first_name', 'middle_name', 'email', 'phone', 'address'],
+    'events': ['title', 'description', 'category'],
+}
+
+
+def add_full_text_search(conn):
+    for table, columns in FTS_TABLES.items():
+        fts_table = f'{table}_fts'
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        old_values = ', '.join(f'OLD.{column}' for column in columns)
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                {column_list}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+        # Внешний content: индекс хранит только токены, синхронизация с таблицей — на триггерах
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts_table}(rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF {column_list} ON {table}
+            BEGIN
+                INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO {fts_table}(rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+
+
+def add_report_aggregates(conn):
+    # Число событий на студента, день и категорию; группы и месяцы агрегируются из неё при запросе
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS event_daily_counts (
+            student_id INTEGER NOT NULL, day TEXT NOT NULL, category TEXT NOT NULL, count INTEGER NOT NULL,
+            PRIMARY KEY (student_id, day, category)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_event_daily_counts_day ON event_daily_counts(day)')
+    conn.execute('DELETE FROM event_daily_counts')
+    conn.execute('''
+        INSERT INTO event_daily_counts (student_id, day, category, count)
+        SELECT student_id, date_iso, COALESCE(category, ''), COUNT(*) FROM events
+        WHERE student_id IS NOT NULL AND date_iso IS NOT NULL
+        GROUP BY student_id, date_iso, COALESCE(category, '')
+    ''')
+
+    # date_iso заполняется другим триггером, порядок срабатывания не гарантирован, поэтому день считаем из date
+    def increment(ref):
+        return f'''
+            INSERT INTO event_daily_counts (student_id, day, category, count)
+            SELECT {ref}.student_id, {iso_date_sql(f'{ref}.date')}, COALESCE({ref}.category, ''), 1
+            WHERE {ref}.student_id IS NOT NULL AND {iso_date_sql(f'{ref}.date')} IS NOT NULL
+            ON CONFLICT (student_id, day, category) DO UPDATE SET count = count + 1;
+        '''
+
+    def decrement(ref):
+        key = f'''student_id = {ref}.student_id AND day = {iso_date_sql(f'{ref}.date')}
+                  AND category = COALESCE({ref}.category, '')'''
+        return f'''
+            UPDATE event_daily_counts SET count = count - 1 WHERE {key};
+            DELETE FROM event_daily_counts WHERE {key} AND count <= 0;
+        '''
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_events_counts_insert AFTER INSERT ON events
+        BEGIN {increment('NEW')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_events_counts_delete AFTER DELETE ON events
+        BEGIN {decrement('OLD')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_events_counts_update AFTER UPDATE OF student_id, date, category ON events
+        BEGIN {decrement('OLD')} {increment('NEW')} END
+    ''')
+
+
+def add_event_filter_indexes(conn):
+    # Фильтр /events?category=&from=&to= без студента или группы
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_category_date ON events(category, date_iso)')
+
+
+def add_event_archives(conn):
+    # Реестр архивных баз событий (по учебным годам), см. archive.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS event_archives (
+            academic_year INTEGER PRIMARY KEY, path TEXT NOT NULL, date_from TEXT, date_to TEXT,
+            events INTEGER NOT NULL, archived_at TEXT NOT NULL
+        )
+    ''')
+
+
+# Номер миграции = позиция в списке + 1, текущая версия хранится в PRAGMA user_version
+MIGRATIONS = [
+    create_base_schema,
+    add_lookup_indexes,
+    add_iso_dates,
+    add_change_log,
+    add_full_text_search,
+    add_report_aggregates,
+    add_event_filter_indexes,
+    add_event_archives,
+]
+
+
+def migrate(conn):
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Версию читаем под блокировкой записи: другой процесс (воркер, десктоп) мог уже применить этот шаг
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.rollback()
+                return
+            MIGRATIONS[version](conn)
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def init_app(app, pool, row_factory=None):
+    app.extensions['db_pool'] = pool
+    app.config['DB_ROW_FACTORY'] = row_factory
+    app.teardown_appcontext(release_db)
+
+
+def get_db():
+    if 'db' not in g:
+        g.db = current_app.extensions['db_pool'].acquire()
+        g.db.row_factory = current_app.config['DB_ROW_FACTORY']
+    return g.db
+
+
+def release_db_on_close(response):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool = current_app.extensions['db_pool']
+        response.call_on_close(lambda: pool.release(conn))
+    return response
+
+
+def release_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        current_app.extensions['db_pool'].release(conn)
@@ -0,0 +1,67 @@
+from flask import Blueprint, Flask
+
+import cache
+import metrics
+import negotiation
+import snapshot
+from db import init_app
+from streaming import ndjson_response, wants_stream
+
+# Маршруты, которые раньше поднимались внутри десктоп-приложения; отдают строки как массивы значений
+bp = Blueprint('desktop_api', __name__, url_prefix='/api')
+
+
+def stream_query(query):
+    cursor = snapshot.get_snapshot_db().cursor()
+    cursor.execute(query)
+    return ndjson_response(cursor)
+
+
+def fetch_rows(query, params=()):
+    cursor = snapshot.get_snapshot_db().cursor()
+    cursor.execute(query, params)
+    rows = [tuple(row) for row in cursor.fetchall()]
+    if negotiation.wants_columns():
+        return negotiation.render(negotiation.columnar_rows([column[0] for column in cursor.description], rows))
+    return negotiation.render(rows)
+
+
+@bp.route('/students', methods=['GET'])
+@cache.cached()
+def get_students():
+    if wants_stream():
+        return stream_query("SELECT * FROM students ORDER BY id")
+    return fetch_rows("SELECT * FROM students")
+
+
+@bp.route('/events', methods=['GET'])
+@cache.cached()
+def get_events():
+    if wants_stream():
+        return stream_query("SELECT * FROM events ORDER BY id")
+    return fetch_rows("SELECT * FROM events")
+
+
+@bp.route('/students/<int:student_id>/events', methods=['GET'])
+@cache.cached()
+def get_student_events(student_id):
+    return fetch_rows("SELECT * FROM events WHERE student_id=?", (student_id,))
+
+
+@bp.route('/groups', methods=['GET'])
+@cache.cached()
+def get_groups():
+    if wants_stream():
+        return stream_query("SELECT * FROM groups ORDER BY id")
+    return fetch_rows("SELECT * FROM groups")
+
+
+def create_app(pool, response_cache):
+    # Встроенный в десктоп API реплику не подключает: get_snapshot_db() читает основную базу
+    app = Flask(__name__)
+    init_app(app, pool)
+    cache.init_app(app, response_cache)
+    metrics.init_app(app)
+    negotiation.init_app(app)
+    app.register_blueprint(bp)
+    return app
@@ -0,0 +1,335 @@
+import csv
+import os
+import sqlite3
+
+from openpyxl import Workbook, load_workbook
+
+from db import InvalidDateError, parse_date, to_display_date
+from validation import validate_email, validate_phone
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+EXPORT_HEADERS = ['ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения', 'Телефон', 'Email', 'Адрес', 'Группа']
+EXPORT_STUDENTS_SQL = '''
+    SELECT students.id, last_name, first_name, middle_name, COALESCE(birth_date_iso, birth_date), phone, email, address,
+           group_name
+    FROM students LEFT JOIN groups ON students.group_id = groups.id
+    ORDER BY students.id
+'''
+REQUIRED_COLUMNS = ['Фамилия', 'Имя', 'Дата рождения', 'Телефон', 'Email']
+
+INSERT_STUDENT_SQL = '''
+    INSERT INTO students (first_name, last_name, middle_name, birth_date, phone, email, address, group_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# id уже найден предварительным проходом: NULL — новая строка, иначе обновление существующей
+UPSERT_STUDENT_SQL = '''
+    INSERT INTO students (id, first_name, last_name, middle_name, birth_date, phone, email, address, group_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        first_name = excluded.first_name, last_name = excluded.last_name, middle_name = excluded.middle_name,
+        birth_date = excluded.birth_date, phone = excluded.phone, email = excluded.email,
+        address = excluded.address, group_id = excluded.group_id
+'''
+SYNC_KEYS_SQL = '''
+    SELECT id, first_name, last_name, middle_name, birth_date, phone, email, address, group_id FROM students
+'''
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def summary(self, max_errors=20):
+        lines = [f"Импортировано записей: {self.imported}", f"Ошибок: {len(self.errors)}"]
+        lines += [f"Строка {row_number}: {message}" for row_number, message in sorted(self.errors)[:max_errors]]
+        if len(self.errors) > max_errors:
+            lines.append(f"... и ещё {len(self.errors) - max_errors}")
+        return '\n'.join(lines)
+
+
+class SyncReport(ImportReport):
+    def __init__(self, dry_run=False):
+        super().__init__()
+        self.dry_run = dry_run
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.conflicts = 0
+
+    def add_conflict(self, row_number, message):
+        self.conflicts += 1
+        self.add_error(row_number, message)
+
+    def summary(self, max_errors=20):
+        lines = ["Пробный прогон, изменения не записаны" if self.dry_run else "Синхронизация выполнена",
+                 f"Добавлено: {self.inserted}", f"Обновлено: {self.updated}", f"Без изменений: {self.unchanged}",
+                 f"Конфликтов: {self.conflicts}", f"Ошибок: {len(self.errors) - self.conflicts}"]
+        lines += [f"Строка {row_number}: {message}" for row_number, message in sorted(self.errors)[:max_errors]]
+        if len(self.errors) > max_errors:
+            lines.append(f"... и ещё {len(self.errors) - max_errors}")
+        return '\n'.join(lines)
+
+
+def iter_excel_rows(file_path):
+    # read_only + values_only: строки читаются потоком, без объектов ячеек и без загрузки всей книги
+    workbook = load_workbook(filename=file_path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        for row_number, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+            yield row_number, dict(zip(headers, row))
+    finally:
+        workbook.close()
+
+
+def cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def prepare_student(row, group_ids):
+    values = {column: cell_text(row.get(column)) for column in
+              ['Фамилия', 'Имя', 'Отчество', 'Телефон', 'Email', 'Адрес', 'Группа']}
+    missing = [column for column in REQUIRED_COLUMNS if not cell_text(row.get(column))]
+    if missing:
+        raise ValueError(f"не заполнены поля: {', '.join(missing)}")
+    if not validate_email(values['Email']):
+        raise ValueError(f"некорректный email '{values['Email']}'")
+    if not validate_phone(values['Телефон']):
+        raise ValueError(f"некорректный телефон '{values['Телефон']}'")
+    try:
+        birth_date = to_display_date(row['Дата рождения'])
+    except InvalidDateError:
+        raise ValueError(f"некорректная дата рождения '{row['Дата рождения']}'")
+    return (values['Имя'], values['Фамилия'], values['Отчество'], birth_date, values['Телефон'], values['Email'],
+            values['Адрес'], group_ids.get(values['Группа']))
+
+
+def insert_batch(conn, batch, report):
+    try:
+        with conn:
+            conn.executemany(INSERT_STUDENT_SQL, [params for _, params in batch])
+        report.imported += len(batch)
+        return
+    except sqlite3.IntegrityError:
+        pass
+    # Пакет откатился целиком: повторяем построчно, чтобы записать в отчёт только конфликтующие строки
+    for row_number, params in batch:
+        try:
+            with conn:
+                conn.execute(INSERT_STUDENT_SQL, params)
+            report.imported += 1
+        except sqlite3.IntegrityError as e:
+            report.add_error(row_number, f"конфликт с существующей записью ({e})")
+
+
+def import_students(conn, rows, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    group_ids = dict(conn.execute('SELECT group_name, id FROM groups'))
+    report = ImportReport()
+    batch = []
+    processed = 0
+    for row_number, row in rows:
+        processed += 1
+        try:
+            batch.append((row_number, prepare_student(row, group_ids)))
+        except ValueError as e:
+            report.add_error(row_number, str(e))
+        if len(batch) >= batch_size:
+            insert_batch(conn, batch, report)
+            batch = []
+            if progress is not None:
+                progress(processed)
+    if batch:
+        insert_batch(conn, batch, report)
+    if progress is not None:
+        progress(processed)
+    return report
+
+
+def load_sync_index(conn):
+    # Один проход по students: email/телефон -> id и текущие значения для сравнения без запросов к базе
+    by_email, by_phone, current = {}, {}, {}
+    for row in conn.execute(SYNC_KEYS_SQL):
+        student_id, values = row[0], row[1:]
+        current[student_id] = values
+        if values[5] is not None:
+            by_email[values[5]] = student_id
+        if values[4] is not None:
+            by_phone[values[4]] = student_id
+    return by_email, by_phone, current
+
+
+def upsert_batch(conn, batch, report):
+    try:
+        with conn:
+            conn.executemany(UPSERT_STUDENT_SQL, [params for _, _, params in batch])
+        for _, student_id, _ in batch:
+            if student_id is None:
+                report.inserted += 1
+            else:
+                report.updated += 1
+        return
+    except sqlite3.IntegrityError:
+        pass
+    # Конфликт с записью, появившейся после предварительного прохода: повторяем построчно
+    for row_number, student_id, params in batch:
+        try:
+            with conn:
+                conn.execute(UPSERT_STUDENT_SQL, params)
+        except sqlite3.IntegrityError as e:
+            report.add_conflict(row_number, f"конфликт с существующей записью ({e})")
+            continue
+        if student_id is None:
+            report.inserted += 1
+        else:
+            report.updated += 1
+
+
+def sync_students(conn, rows, batch_size=IMPORT_BATCH_SIZE, dry_run=False, progress=None):
+    # Повторная синхронизация того же реестра пишет только изменившиеся строки
+    group_ids = dict(conn.execute('SELECT group_name, id FROM groups'))
+    by_email, by_phone, current = load_sync_index(conn)
+    report = SyncReport(dry_run)
+    seen_rows = {}
+    batch = []
+    processed = 0
+    for row_number, row in rows:
+        processed += 1
+        try:
+            values = prepare_student(row, group_ids)
+        except ValueError as e:
+            report.add_error(row_number, str(e))
+            continue
+        phone, email = values[4], values[5]
+        duplicate = seen_rows.get(('email', email)) or seen_rows.get(('phone', phone))
+        if duplicate is not None:
+            report.add_conflict(row_number, f"email или телефон уже встречались в строке {duplicate}")
+            continue
+        seen_rows[('email', email)] = seen_rows[('phone', phone)] = row_number
+
+        email_id, phone_id = by_email.get(email), by_phone.get(phone)
+        if email_id is not None and phone_id is not None and email_id != phone_id:
+            report.add_conflict(row_number, f"email принадлежит студенту {email_id}, телефон — студенту {phone_id}")
+            continue
+        student_id = email_id if email_id is not None else phone_id
+        if student_id is not None and current[student_id] == values:
+            report.unchanged += 1
+            continue
+        if dry_run:
+            if student_id is None:
+                report.inserted += 1
+            else:
+                report.updated += 1
+            continue
+        batch.append((row_number, student_id, (student_id,) + values))
+        if len(batch) >= batch_size:
+            upsert_batch(conn, batch, report)
+            batch = []
+            if progress is not None:
+                progress(processed)
+    if batch:
+        upsert_batch(conn, batch, report)
+    if progress is not None:
+        progress(processed)
+    return report
+
+
+def format_from_path(file_path):
+    export_format = os.path.splitext(file_path)[1].lstrip('.').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format or file_path}")
+    return export_format
+
+
+def iter_batches(cursor, batch_size=EXPORT_BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def write_xlsx(file_path, headers, batches, date_column=None):
+    # write_only: строки сразу сериализуются в XML и не держатся в памяти книгой
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet.append(headers)
+    for rows in batches:
+        for row in rows:
+            if date_column is not None and row[date_column]:
+                row = list(row)
+                try:
+                    row[date_column] = parse_date(row[date_column])
+                except InvalidDateError:
+                    # Нераспознанная старая дата (birth_date_iso пуст) выгружается как записана
+                    pass
+            worksheet.append(row)
+    workbook.save(file_path)
+
+
+def write_csv(file_path, headers, batches):
+    with open(file_path, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        writer.writerow(headers)
+        for rows in batches:
+            writer.writerows(rows)
+
+
+def write_parquet(file_path, headers, batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для экспорта в Parquet установите пакет pyarrow")
+    schema = pa.schema([(header, pa.int64() if i == 0 else pa.string()) for i, header in enumerate(headers)])
+    with pq.ParquetWriter(file_path, schema) as writer:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch([list(column) for column in columns], schema=schema))
+
+
+def iter_csv_chunks(cursor, headers, batch_size=EXPORT_BATCH_SIZE):
+    class Buffer:
+        def write(self, value):
+            return value
+
+    writer = csv.writer(Buffer())
+    yield writer.writerow(headers)
+    for rows in iter_batches(cursor, batch_size):
+        yield ''.join(writer.writerow(row) for row in rows)
+
+
+def export_students(conn, file_path, export_format='xlsx', progress=None, batch_size=EXPORT_BATCH_SIZE):
+    total = conn.execute('SELECT COUNT(*) FROM students').fetchone()[0]
+    cursor = conn.execute(EXPORT_STUDENTS_SQL)
+
+    def tracked_batches():
+        done = 0
+        for rows in iter_batches(cursor, batch_size):
+            yield rows
+            done += len(rows)
+            if progress is not None:
+                progress(done, total)
+
+    if export_format == 'xlsx':
+        write_xlsx(file_path, EXPORT_HEADERS, tracked_batches(), date_column=4)
+    elif export_format == 'csv':
+        write_csv(file_path, EXPORT_HEADERS, tracked_batches())
+    elif export_format == 'parquet':
+        write_parquet(file_path, EXPORT_HEADERS, tracked_batches())
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    return total
@@ -0,0 +1,120 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE_SIZE = 10000
+INGEST_BATCH_SIZE = 500
+INGEST_FLUSH_INTERVAL = 0.05
+
+INSERT_EVENT_SQL = '''
+    INSERT INTO events (student_id, date, title, description, category) VALUES (?, ?, ?, ?, ?)
+'''
+
+
+class IngestStopped(Exception):
+    pass
+
+
+class EventIngestQueue:
+    def __init__(self, pool, max_size=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE,
+                 flush_interval=INGEST_FLUSH_INTERVAL, on_flush=None):
+        self.pool = pool
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='event-ingest', daemon=True)
+        self.lock = threading.Lock()
+        self.counters = {'enqueued': 0, 'rejected': 0, 'written': 0, 'failed': 0, 'batches': 0}
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, params):
+        # False — очередь переполнена (стоит повторить позже); после stop() — IngestStopped
+        if self.stopping.is_set():
+            raise IngestStopped('Event ingestion is shutting down')
+        try:
+            self.queue.put_nowait((time.monotonic(), params))
+        except queue.Full:
+            with self.lock:
+                self.counters['rejected'] += 1
+            return False
+        with self.lock:
+            self.counters['enqueued'] += 1
+        return True
+
+    def collect_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        # Групповая фиксация: ждём до flush_interval, чтобы в одну транзакцию попало больше событий
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = self.collect_batch()
+            if batch:
+                self.flush(batch)
+
+    def flush(self, batch):
+        written = failed = 0
+        with self.pool.connection() as conn:
+            try:
+                with conn:
+                    conn.executemany(INSERT_EVENT_SQL, [params for _, params in batch])
+                written = len(batch)
+            except sqlite3.IntegrityError:
+                # Пакет откатился целиком: сохраняем всё, что можно, по одной записи
+                for _, params in batch:
+                    try:
+                        with conn:
+                            conn.execute(INSERT_EVENT_SQL, params)
+                        written += 1
+                    except sqlite3.IntegrityError as e:
+                        # Студента удалили уже после постановки в очередь: клиент получил 202, поэтому событие
+                        # пишем в лог целиком, чтобы его можно было восстановить
+                        logger.error('Queued event rejected (%s): %r', e, params)
+                        failed += 1
+        now = time.monotonic()
+        latencies = [now - enqueued_at for enqueued_at, _ in batch]
+        with self.lock:
+            self.counters['written'] += written
+            self.counters['failed'] += failed
+            self.counters['batches'] += 1
+            self.latency_total += sum(latencies)
+            self.latency_max = max(self.latency_max, max(latencies))
+        if self.on_flush is not None and written:
+            self.on_flush()
+
+    def stop(self, timeout=10):
+        # Останавливаемся после того, как очередь полностью записана в базу
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        # Поток демонический: всё, что не успело записаться, пропадёт вместе с процессом
+        if self.thread.is_alive() or not self.queue.empty():
+            logger.warning('Event ingest stopped with %d event(s) not written', self.queue.qsize())
+
+    def metrics(self):
+        with self.lock:
+            processed = self.counters['written'] + self.counters['failed']
+            return dict(self.counters, depth=self.queue.qsize(), capacity=self.queue.maxsize,
+                        latency_avg=self.latency_total / processed if processed else 0.0,
+                        latency_max=self.latency_max)
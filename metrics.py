@@ -0,0 +1,266 @@
+import cProfile
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import Response, g, request
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_THRESHOLD = 0.1
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Счётчики строк текущего запроса; вне запросов (GUI, фоновые потоки) не установлены
+request_rows = ContextVar('request_rows', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels, le=repr(bound))} {cumulative}')
+        lines.append(f'{name}_bucket{format_labels(labels, le="+Inf")} {self.count}')
+        lines.append(f'{name}_sum{format_labels(labels)} {self.total}')
+        lines.append(f'{name}_count{format_labels(labels)} {self.count}')
+        return lines
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+class MetricsRegistry:
+    def __init__(self, slow_query_threshold=SLOW_QUERY_THRESHOLD):
+        self.slow_query_threshold = slow_query_threshold
+        self.lock = threading.Lock()
+        self.request_latency = {}
+        self.request_counts = {}
+        self.rows_read = {}
+        self.rows_written = {}
+        self.query_latency = {}
+        self.fetch_seconds = 0.0
+        self.slow_queries = 0
+
+    def observe_request(self, route, method, status, seconds, rows_read, rows_written):
+        key = (('route', route), ('method', method))
+        with self.lock:
+            self.request_latency.setdefault(key, Histogram()).observe(seconds)
+            status_key = key + (('status', str(status)),)
+            self.request_counts[status_key] = self.request_counts.get(status_key, 0) + 1
+            self.rows_read[key] = self.rows_read.get(key, 0) + rows_read
+            self.rows_written[key] = self.rows_written.get(key, 0) + rows_written
+
+    def observe_query(self, statement, seconds):
+        key = (('statement', statement),)
+        with self.lock:
+            self.query_latency.setdefault(key, Histogram()).observe(seconds)
+
+    def observe_fetch(self, seconds):
+        with self.lock:
+            self.fetch_seconds += seconds
+
+    def observe_slow_query(self):
+        with self.lock:
+            self.slow_queries += 1
+
+    def render(self):
+        lines = []
+
+        def histograms(name, help_text, series):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} histogram'])
+            for labels, histogram in sorted(series.items()):
+                lines.extend(histogram.render(name, labels))
+
+        def counters(name, help_text, series):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} counter'])
+            for labels, value in sorted(series.items()):
+                lines.append(f'{name}{format_labels(labels)} {value}')
+
+        with self.lock:
+            histograms('student_api_request_duration_seconds', 'Request latency by route.', self.request_latency)
+            counters('student_api_requests_total', 'Requests by route and status.', self.request_counts)
+            counters('student_api_rows_read_total', 'Rows fetched from SQLite by route.', self.rows_read)
+            counters('student_api_rows_written_total', 'Rows changed in SQLite by route.', self.rows_written)
+            histograms('student_db_query_duration_seconds', 'SQL execute() latency by statement kind.',
+                       self.query_latency)
+            counters('student_db_fetch_seconds_total', 'Time spent reading result rows.', {(): self.fetch_seconds})
+            counters('student_db_slow_queries_total', 'Statements slower than the threshold.',
+                     {(): self.slow_queries})
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def statement_kind(sql):
+    words = sql.lstrip().split(None, 1)
+    kind = words[0].lower() if words else ''
+    return kind if kind in ('select', 'insert', 'update', 'delete', 'with') else 'other'
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Гистограмма меряет сам execute (для SELECT — до первой строки), время чтения строк копится отдельно;
+    # порог медленного запроса сравнивается с суммой execute и всех fetch* одного запроса
+    registry = REGISTRY
+    statement = ('', None)
+    elapsed = 0.0
+    reported_slow = False
+
+    def execute(self, sql, parameters=()):
+        self.statement = (sql, parameters)
+        self.elapsed = 0.0
+        self.reported_slow = False
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.finish_step(started, execute=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.statement = (sql, None)
+        self.elapsed = 0.0
+        self.reported_slow = False
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.finish_step(started, execute=True)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.finish_step(started, read=0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.finish_step(started, read=len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.finish_step(started, read=len(rows))
+        return rows
+
+    def finish_step(self, started, read=0, execute=False):
+        step = time.perf_counter() - started
+        sql, parameters = self.statement
+        self.elapsed += step
+        if execute:
+            self.registry.observe_query(statement_kind(sql), step)
+        else:
+            self.registry.observe_fetch(step)
+        rows = request_rows.get()
+        if rows is not None:
+            rows['read'] += read
+            if execute and self.rowcount > 0:
+                rows['written'] += self.rowcount
+        if not self.reported_slow and self.elapsed >= self.registry.slow_query_threshold:
+            self.reported_slow = True
+            self.registry.observe_slow_query()
+            log_slow_query(self.connection, sql, parameters, self.elapsed)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute в C не вызывает self.cursor(), поэтому переопределяем оба пути
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def explain(conn, sql, parameters):
+    if parameters is None:
+        return 'n/a (executemany)'
+    try:
+        plan = conn.cursor(sqlite3.Cursor).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return f'n/a ({e})'
+    return '\n'.join(f'  {row[0]}|{row[1]}| {row[-1]}' for row in plan)
+
+
+def log_slow_query(conn, sql, parameters, seconds):
+    logger.warning('Slow query (%.1f ms): %s\nparams: %r\nplan:\n%s', seconds * 1000, ' '.join(sql.split()),
+                   parameters, explain(conn, sql, parameters))
+
+
+def init_app(app, registry=REGISTRY):
+    registry.slow_query_threshold = app.config.get('SLOW_QUERY_THRESHOLD', registry.slow_query_threshold)
+    app.extensions['metrics'] = registry
+
+    @app.before_request
+    def start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics_rows = {'read': 0, 'written': 0}
+        g.metrics_token = request_rows.set(g.metrics_rows)
+        # Профилирование по ?profile=1 либо случайной выборке доли запросов, только если разрешено конфигом
+        if app.config.get('PROFILING') and (request.args.get('profile') == '1'
+                                             or random.random() < app.config.get('PROFILE_SAMPLE_RATE', 0.0)):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            response.headers['X-Profile'] = save_profile(app.config.get('PROFILE_DIR', 'profiles'), profiler)
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        # Для потоковых ответов учитывается время до первого байта, тело отдаётся уже после
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        rows = g.pop('metrics_rows')
+        registry.observe_request(route, request.method, response.status_code, time.perf_counter() - started,
+                                 rows['read'], rows['written'])
+        return response
+
+    @app.teardown_request
+    def reset_rows(exc=None):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            request_rows.reset(token)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(registry.render(), mimetype=PROMETHEUS_MIMETYPE)
+
+
+def save_profile(directory, profiler):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns()}-{request.method}-"
+                                   f"{request.path.strip('/').replace('/', '_') or 'root'}-{os.getpid()}.prof")
+    profiler.dump_stats(path)
+    return path
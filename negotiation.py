@@ -0,0 +1,131 @@
+import zlib
+
+from flask import Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+# orjson и msgpack необязательны: без orjson работает стандартный json, без msgpack этот формат не предлагается
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Ответы меньше порога не сжимаются: заголовок gzip и время CPU съедают выигрыш
+COMPRESSION_MIN_SIZE = 1024
+# Уровень 1 (как gzip_comp_level по умолчанию в nginx): страница из 1000 студентов сжимается в ~6 раз
+# за ~2.5 мс; уровень 6 даёт ещё ~30% выигрыша, но в 2.5 раза дороже по CPU
+COMPRESSION_LEVEL = 1
+COMPRESSIBLE_MIMETYPES = (JSON_MIMETYPE, 'application/x-ndjson', 'text/csv', 'text/plain', MSGPACK_MIMETYPE)
+# wbits для zlib: 31 — формат gzip, 15 — zlib-поток, который в HTTP называется deflate
+CONTENT_ENCODINGS = {'gzip': 31, 'deflate': 15}
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # Тот же app.json/jsonify, только сериализует orjson. Порядок ключей и формат дат — как у провайдера Flask:
+    # даты отдаются в default, ключи сортируются
+    def options(self):
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        return options | orjson.OPT_SORT_KEYS if self.sort_keys else options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.options()).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self.options()),
+                                        mimetype=self.mimetype)
+
+
+def wants_columns():
+    return request.args.get('format') == 'columns'
+
+
+def columnar(items, fields):
+    # ?format=columns: список полей и по массиву значений на каждое поле вместо повторения ключей в каждой строке
+    return {'fields': fields, 'columns': [[item[field] for item in items] for field in fields]}
+
+
+def columnar_rows(fields, rows):
+    return {'fields': fields, 'columns': [list(column) for column in zip(*rows)] or [[] for _ in fields]}
+
+
+def list_body(items, fields, **extra):
+    # Поля берём из самих строк: ?include= добавляет к ним вложенные данные
+    body = columnar(items, list(items[0]) if items else fields) if wants_columns() else {'items': items}
+    body.update(extra)
+    return body
+
+
+def preferred_mimetype():
+    # Как и с NDJSON, при "Accept: */*" остаётся JSON; MessagePack — только по явному запросу
+    offered = [JSON_MIMETYPE] + ([MSGPACK_MIMETYPE] if msgpack is not None else [])
+    return request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+
+
+def render(body, status=200):
+    if preferred_mimetype() == MSGPACK_MIMETYPE:
+        return Response(msgpack.packb(body, use_bin_type=True), status=status, mimetype=MSGPACK_MIMETYPE)
+    return jsonify(body), status
+
+
+def compress_bytes(data, encoding, level=COMPRESSION_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, CONTENT_ENCODINGS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_chunks(chunks, encoding, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, CONTENT_ENCODINGS[encoding])
+    try:
+        for chunk in chunks:
+            # Каждую пачку строк отдаём сразу (Z_SYNC_FLUSH), иначе поток копился бы в буфере компрессора
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield data + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, level=COMPRESSION_LEVEL, min_size=COMPRESSION_MIN_SIZE):
+    # Файлы (send_file) и уже сжатые форматы (xlsx, parquet) не трогаем
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(list(CONTENT_ENCODINGS))
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, encoding, level)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress_bytes(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    # Сжатое представление побайтно отличается от несжатого: ETag становится слабым, If-None-Match
+    # при этом сравнивается слабо и по-прежнему даёт 304
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    # Кириллица в UTF-8 вдвое короче, чем экранированная \uXXXX
+    app.json.ensure_ascii = False
+    level = app.config.get('COMPRESSION_LEVEL', COMPRESSION_LEVEL)
+    min_size = app.config.get('COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE)
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, level, min_size)
@@ -0,0 +1,64 @@
+from archive import events_source
+from db import to_iso_date
+
+GRANULARITIES = {'day': 'c.day', 'month': 'substr(c.day, 1, 7)'}
+DETAIL_PAGE_SIZE = 100
+
+
+def report_filters(group_name, date_from, date_to):
+    # Для группы берём её текущих студентов: индекс по students.group_id, затем диапазон по ключу агрегата
+    conditions, params = [], []
+    if group_name is not None:
+        conditions.append('s.group_id IN (SELECT id FROM groups WHERE group_name = ?)')
+        params.append(group_name)
+    if date_from:
+        conditions.append('c.day >= ?')
+        params.append(to_iso_date(date_from))
+    if date_to:
+        conditions.append('c.day <= ?')
+        params.append(to_iso_date(date_to))
+    return ' AND '.join(conditions) or '1', params
+
+
+def aggregate(conn, select, group_by, group_name, date_from, date_to):
+    where, params = report_filters(group_name, date_from, date_to)
+    return conn.execute(f'''
+        SELECT {select}, SUM(c.count) AS events
+        FROM event_daily_counts c JOIN students s ON s.id = c.student_id
+        WHERE {where}
+        GROUP BY {group_by} ORDER BY {group_by}
+    ''', params).fetchall()
+
+
+def summary(conn, group_name=None, date_from=None, date_to=None, granularity='month'):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    period = GRANULARITIES[granularity]
+    return {
+        'by_period': aggregate(conn, f'{period} AS period, c.category', '1, 2', group_name, date_from, date_to),
+        'by_category': aggregate(conn, 'c.category', '1', group_name, date_from, date_to),
+        'by_student': aggregate(conn, 's.id, s.last_name, s.first_name, s.middle_name', '1, 2, 3, 4',
+                                group_name, date_from, date_to),
+    }
+
+
+def detail(conn, group_name, date_from=None, date_to=None, after_id=0, limit=None):
+    conditions, params = ['g.group_name = ?', 'e.id > ?'], [group_name, after_id]
+    if date_from:
+        conditions.append('e.date_iso >= ?')
+        params.append(to_iso_date(date_from))
+    if date_to:
+        conditions.append('e.date_iso <= ?')
+        params.append(to_iso_date(date_to))
+    query = f'''
+        SELECT e.id, s.id, s.last_name, s.first_name, s.middle_name, e.date, e.title, e.description, e.category
+        FROM students s
+        JOIN {events_source(conn, date_from, date_to)} e ON s.id = e.student_id
+        JOIN groups g ON s.group_id = g.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY e.id
+    '''
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return conn.execute(query, params).fetchall()
@@ -0,0 +1,44 @@
+class RowStore:
+    # Строки хранятся кортежами (компактнее любого объекта-записи, и их без преобразования принимают Treeview,
+    # фильтрация и экспорт), доступ по id — через dict. Повторяющиеся значения в shared_columns
+    # (группы, категории, даты, имена) хранятся в одном экземпляре на всё хранилище.
+    def __init__(self, shared_columns=()):
+        self.shared_columns = tuple(shared_columns)
+        self.rows = {}
+        self.shared_values = {}
+
+    def compact(self, row):
+        # shared_columns должны быть TEXT/INTEGER: значения разных типов, равные по == (1 и 1.0), слились бы в одно
+        setdefault = self.shared_values.setdefault
+        values = list(row)
+        for index in self.shared_columns:
+            value = values[index]
+            values[index] = setdefault(value, value)
+        return tuple(values)
+
+    def load(self, rows):
+        self.rows = {}
+        self.shared_values = {}
+        for row in rows:
+            row = self.compact(row)
+            self.rows[row[0]] = row
+
+    def get(self, row_id):
+        return self.rows.get(row_id)
+
+    def put(self, row):
+        row = self.compact(row)
+        self.rows[row[0]] = row
+        return row
+
+    def remove(self, row_id):
+        return self.rows.pop(row_id, None)
+
+    def __contains__(self, row_id):
+        return row_id in self.rows
+
+    def __iter__(self):
+        return iter(self.rows.values())
+
+    def __len__(self):
+        return len(self.rows)
@@ -0,0 +1,45 @@
+import re
+
+SEARCH_LIMIT = 500
+
+STUDENT_SEARCH_SQL = '''
+    SELECT students.id, students.last_name, students.first_name, students.middle_name, students.birth_date,
+           students.phone, students.email, students.address, groups.group_name
+    FROM students_fts
+    JOIN students ON students.id = students_fts.rowid
+    LEFT JOIN groups ON students.group_id = groups.id
+    WHERE students_fts MATCH ?
+    ORDER BY students_fts.rank
+    LIMIT ?
+'''
+EVENT_SEARCH_SQL = '''
+    SELECT events.id, events.student_id, events.date, events.title, events.description, events.category
+    FROM events_fts
+    JOIN events ON events.id = events_fts.rowid
+    WHERE events_fts MATCH ?
+    ORDER BY events_fts.rank
+    LIMIT ?
+'''
+
+
+def build_match_query(text):
+    # Каждое слово ищется по префиксу, слова объединяются через AND; кавычки экранируют синтаксис FTS5
+    tokens = re.findall(r'\w+', text.lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search(conn, sql, text, limit=SEARCH_LIMIT):
+    match_query = build_match_query(text)
+    if match_query is None:
+        return []
+    return conn.execute(sql, (match_query, limit)).fetchall()
+
+
+def search_students(conn, text, limit=SEARCH_LIMIT):
+    return search(conn, STUDENT_SEARCH_SQL, text, limit)
+
+
+def search_events(conn, text, limit=SEARCH_LIMIT):
+    return search(conn, EVENT_SEARCH_SQL, text, limit)
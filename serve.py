@@ -0,0 +1,136 @@
+import argparse
+import queue
+import signal
+import threading
+import time
+
+from waitress import create_server, wasyncore
+
+# waitress обязателен; gunicorn нужен только для --workers > 1 (POSIX): pip install gunicorn
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5000
+DEFAULT_WORKERS = 1
+DEFAULT_THREADS = 8
+DEFAULT_KEEPALIVE = 5
+GRACEFUL_TIMEOUT = 30
+FLUSH_POLL_INTERVAL = 0.05
+
+
+class BackgroundServer:
+    # Сокеты waitress принадлежат потоку цикла asyncore: закрывать их из другого потока нельзя (select падает
+    # с EBADF), поэтому stop() только передаёт команды в цикл через trigger и ждёт
+    def __init__(self, app, host=DEFAULT_HOST, port=DEFAULT_PORT, threads=DEFAULT_THREADS,
+                 keepalive=DEFAULT_KEEPALIVE):
+        self.server = create_server(app, host=host, port=port, threads=threads, channel_timeout=keepalive,
+                                    clear_untrusted_proxy_headers=True)
+        self.commands = queue.Queue()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='api-server', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        server = self.server
+        while not self.stopped.is_set():
+            server.asyncore.loop(timeout=server.adj.asyncore_loop_timeout, map=server._map,
+                                 use_poll=server.adj.asyncore_use_poll, count=1)
+            while not self.commands.empty():
+                self.commands.get_nowait()()
+        for channel in list(server._map.values()):
+            channel.close()
+
+    def call_in_loop(self, func):
+        self.commands.put(func)
+        self.server.pull_trigger()
+
+    def stop_accepting(self):
+        # Закрываем только слушающий сокет; server.close() закрыл бы и trigger
+        self.server.accepting = False
+        wasyncore.dispatcher.close(self.server)
+
+    def flush(self, deadline):
+        # Ответы завершённых запросов дописываются в сокеты тем же циклом
+        server = self.server
+        while time.monotonic() < deadline and any(channel.writable() for channel in list(server._map.values())):
+            server.asyncore.loop(timeout=FLUSH_POLL_INTERVAL, map=server._map,
+                                 use_poll=server.adj.asyncore_use_poll, count=1)
+        self.stopped.set()
+
+    def stop(self, timeout=GRACEFUL_TIMEOUT):
+        # Сначала перестаём принимать соединения, затем даём дописаться уже принятым запросам
+        deadline = time.monotonic() + timeout
+        self.call_in_loop(self.stop_accepting)
+        self.server.task_dispatcher.shutdown(cancel_pending=False, timeout=timeout)
+        self.call_in_loop(lambda: self.flush(deadline))
+        self.thread.join(max(deadline - time.monotonic(), 0) + FLUSH_POLL_INTERVAL * 2)
+
+
+def serve_threaded(app, host, port, threads, keepalive):
+    server = BackgroundServer(app, host, port, threads, keepalive)
+    stopped = threading.Event()
+
+    def shutdown(signum, frame):
+        stopped.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    server.start()
+    print(f"Serving on http://{host}:{port} ({threads} threads)")
+    stopped.wait()
+    server.stop()
+
+
+def serve_workers(host, port, workers, threads, keepalive):
+    # Несколько процессов: gunicorn (только POSIX); каждый воркер создаёт своё приложение и свой пул соединений.
+    # Схему готовит мастер до форка (без preload: соединения SQLite через fork не переживают), воркеры
+    # стартуют с готовой базой и при запуске в неё не пишут
+    from api import config_from_env, create_app, prepare_database
+    from db import connect
+
+    conn = connect(config_from_env()['DATABASE'])
+    try:
+        prepare_database(conn)
+    finally:
+        conn.close()
+
+    class Application(BaseApplication):
+        def load_config(self):
+            settings = {'bind': f'{host}:{port}', 'workers': workers, 'threads': threads,
+                        'worker_class': 'gthread', 'keepalive': keepalive, 'graceful_timeout': GRACEFUL_TIMEOUT}
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return create_app({'MIGRATE': False})
+
+    Application().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API модуля учёта студентов")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="число процессов; больше 1 — через gunicorn (pip install gunicorn, только POSIX)")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS)
+    parser.add_argument('--keepalive', type=int, default=DEFAULT_KEEPALIVE)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if BaseApplication is None:
+            parser.error("для --workers > 1 установите пакет gunicorn (только POSIX) или запустите один процесс")
+        serve_workers(args.host, args.port, args.workers, args.threads, args.keepalive)
+    else:
+        from api import create_app
+        serve_threaded(create_app(), args.host, args.port, args.threads, args.keepalive)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, jsonify
+
+from db import ConnectionPool, connect, get_db
+
+logger = logging.getLogger(__name__)
+
+# Насколько отчёты, выгрузки и тяжёлые списки API могут отставать от основной базы, с
+SNAPSHOT_MAX_AGE = 10.0
+
+
+def snapshot_path(database):
+    # Своя копия у каждого процесса (воркеры gunicorn, десктоп): общая перезаписывалась бы чужими, возможно
+    # более старыми, копиями
+    return f'{os.path.splitext(database)[0]}.snapshot-{os.getpid()}.db'
+
+
+class SnapshotService:
+    # Реплика для чтения: копия основной базы через online backup API. Отчёты и выгрузки читают её целиком
+    # из одного согласованного состояния и не конкурируют с правками, основная база обслуживает только OLTP.
+    # Реплика — файл в WAL-режиме рядом с основной базой: читатели из пула не мешают обновлению, а
+    # относительные пути архивов событий (archive.py) разрешаются так же, как для основной базы.
+    # Копия обновляется только по запросу, когда она старше max_age и основная база менялась: полная копия
+    # базы стоит дорого, и процесс без отчётов и выгрузок её не делает вовсе.
+    def __init__(self, database, path=None, max_age=SNAPSHOT_MAX_AGE, factory=sqlite3.Connection, on_refresh=None):
+        self.database = database
+        self.path = path or snapshot_path(database)
+        # Файл по умолчанию принадлежит процессу и удаляется в stop(); явно заданный путь не трогаем
+        self.owns_path = path is None
+        self.max_age = max_age
+        self.on_refresh = on_refresh
+        self.readers = ConnectionPool(self.path, factory=factory, read_only=True)
+        self.lock = threading.Lock()
+        self.source = None
+        self.writer = None
+        self.data_version = None
+        # Момент (monotonic), на который реплика гарантированно содержала все зафиксированные изменения
+        self.synced_at = None
+        self.refreshes = 0
+
+    def age(self):
+        return None if self.synced_at is None else time.monotonic() - self.synced_at
+
+    def ensure_fresh(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        age = self.age()
+        if age is not None and age <= max_age:
+            return
+        with self.lock:
+            age = self.age()
+            if age is None or age > max_age:
+                self.sync()
+
+    def sync(self):
+        # Вызывается под self.lock. PRAGMA data_version меняется, только когда изменения фиксирует другое
+        # соединение (в том числе из другого процесса); своё соединение-источник ничего не пишет
+        started = time.monotonic()
+        if self.source is None:
+            self.source = connect(self.database)
+            self.writer = connect(self.path)
+        data_version = self.source.execute('PRAGMA data_version').fetchone()[0]
+        refreshed = data_version != self.data_version
+        if refreshed:
+            # Копия за один шаг: источник читается в одной транзакции и не блокирует писателей (WAL)
+            self.source.backup(self.writer)
+            self.data_version = data_version
+            self.refreshes += 1
+            logger.debug('Snapshot %s refreshed in %.1f ms', self.path, (time.monotonic() - started) * 1000)
+        self.synced_at = started
+        if refreshed and self.on_refresh is not None:
+            self.on_refresh()
+
+    @contextmanager
+    def connection(self, row_factory=None, max_age=None):
+        self.ensure_fresh(max_age)
+        with self.readers.connection(row_factory) as conn:
+            yield conn
+
+    def stop(self):
+        with self.lock:
+            for conn in (self.source, self.writer):
+                if conn is not None:
+                    conn.close()
+            self.source = self.writer = None
+        self.readers.close()
+        for suffix in ('', '-wal', '-shm') if self.owns_path else ():
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        age = self.age()
+        return {'path': self.path, 'max_age': self.max_age, 'age': None if age is None else round(age, 3),
+                'refreshes': self.refreshes}
+
+
+def init_app(app, service):
+    app.extensions['snapshot'] = service
+    app.teardown_appcontext(release_snapshot_db)
+
+    @app.after_request
+    def add_snapshot_age(response):
+        # Явная граница устарелости: ответ построен по реплике, отстающей не больше чем на столько секунд
+        if 'snapshot_age' in g:
+            response.headers['X-Snapshot-Age'] = f'{g.snapshot_age:.3f}'
+        return response
+
+    @app.route('/snapshot/stats', methods=['GET'])
+    def snapshot_stats():
+        return jsonify(service.stats()), 200
+
+
+def get_snapshot_db():
+    # Без подключённого сервиса (SNAPSHOT_MODE=live) читаем из основной базы
+    service = current_app.extensions.get('snapshot')
+    if service is None:
+        return get_db()
+    if 'snapshot_db' not in g:
+        service.ensure_fresh()
+        g.snapshot_db = service.readers.acquire()
+        g.snapshot_db.row_factory = current_app.config.get('DB_ROW_FACTORY')
+        g.snapshot_age = service.age()
+    return g.snapshot_db
+
+
+def release_snapshot_db_on_close(response):
+    conn = g.pop('snapshot_db', None)
+    if conn is not None:
+        readers = current_app.extensions['snapshot'].readers
+        response.call_on_close(lambda: readers.release(conn))
+    return response
+
+
+def release_snapshot_db(exc=None):
+    conn = g.pop('snapshot_db', None)
+    if conn is not None:
+        current_app.extensions['snapshot'].readers.release(conn)
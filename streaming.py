@@ -0,0 +1,40 @@
+import json
+
+from flask import Response, request, stream_with_context
+
+from db import release_db_on_close
+from snapshot import release_snapshot_db_on_close
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 500
+
+
+def wants_stream():
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    # При "Accept: */*" выигрывает обычный JSON, NDJSON отдаём только по явному запросу
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def iter_ndjson(cursor, batch_size=STREAM_BATCH_SIZE):
+    columns = [description[0] for description in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+def release_on_close(response):
+    # teardown запроса срабатывает, как только view вернул ответ, а поток дочитывается позже: соединения запроса
+    # возвращаются в пул только при закрытии ответа, иначе другой запрос получил бы соединение с открытым курсором
+    release_db_on_close(response)
+    release_snapshot_db_on_close(response)
+    return response
+
+
+def ndjson_response(cursor, on_close=None, batch_size=STREAM_BATCH_SIZE):
+    response = Response(stream_with_context(iter_ndjson(cursor, batch_size)), mimetype=NDJSON_MIMETYPE)
+    if on_close is not None:
+        response.call_on_close(on_close)
+    return release_on_close(response)
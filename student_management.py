@@ -1,11 +1,36 @@
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
-from openpyxl import Workbook, load_workbook
-import sqlite3
-from flask import Flask, jsonify
 from tkcalendar import DateEntry
-from threading import Thread
-import re
+import os
+
+import cache
+import desktop_api
+import excel_io
+import reports
+import search
+from changes import ChangeTracker
+from db import DATABASE, ConnectionPool, InvalidDateError, migrate, prune_change_log
+from metrics import InstrumentedConnection
+from row_store import RowStore
+from serve import BackgroundServer
+from snapshot import SNAPSHOT_MAX_AGE, SnapshotService
+from tasks import TaskRunner
+from validation import validate_email, validate_phone
+from virtual_tree import LazyTreeview
+
+STUDENTS_QUERY = '''
+    SELECT students.id, last_name, first_name, middle_name, birth_date, phone, email, address, group_name
+    FROM students LEFT JOIN groups ON students.group_id = groups.id
+'''
+EVENTS_QUERY = 'SELECT id, student_id, date, title, description, category FROM events'
+GROUPS_QUERY = 'SELECT id, group_name FROM groups'
+# Колонки с часто повторяющимися значениями (имена, даты, группы, категории) в кэше строк
+STUDENT_SHARED_COLUMNS = (1, 2, 3, 4, 8)
+EVENT_SHARED_COLUMNS = (1, 2, 3, 5)
+# Как часто подхватывать изменения, сделанные другими соединениями (например, через API), мс
+CHANGE_POLL_INTERVAL = 2000
+# Пауза после последнего нажатия клавиши перед запросом к полнотекстовому индексу, мс
+SEARCH_DEBOUNCE = 250
 
 class StudentManagementSystem:
     def __init__(self, root):
@@ -16,7 +41,9 @@ class StudentManagementSystem:
 
         self.setup_ui()
         self.setup_database()
+        self.setup_tasks()
         self.load_data()
+        self.setup_change_tracking()
         self.setup_api()
 
     def setup_ui(self):
@@ -25,10 +52,26 @@ class StudentManagementSystem:
         self.create_toolbar()
 
     def setup_database(self):
-        self.conn = sqlite3.connect('student_management.db', check_same_thread=False)
-        self.conn.execute('PRAGMA foreign_keys = ON')
+        # Tk-поток держит собственное соединение, API берёт соединения из того же пула на время запроса
+        self.pool = ConnectionPool(DATABASE, factory=InstrumentedConnection)
+        self.conn = self.pool.acquire()
         self.cursor = self.conn.cursor()
         self.create_tables()
+        self.create_row_stores()
+
+    def create_row_stores(self):
+        # Кэш строк в памяти: вкладки, поиск по группам и окна редактирования берут строки отсюда по id
+        self.students = RowStore(STUDENT_SHARED_COLUMNS)
+        self.events = RowStore(EVENT_SHARED_COLUMNS)
+        self.groups = RowStore()
+
+    def setup_tasks(self):
+        # Импорт, экспорт и отчёты выполняются в фоне, каждая задача со своим соединением из пула
+        self.tasks = TaskRunner(self.root, self.pool)
+        # Отчёты и экспорт читают согласованную копию базы, а не соединение, в которое пишут правки и импорт.
+        # Копия обновляется перед задачей, только если она старше SNAPSHOT_MAX_AGE и база с тех пор менялась:
+        # полное копирование после каждой правки съело бы выигрыш предрассчитанных отчётов на больших базах
+        self.snapshot = SnapshotService(DATABASE, max_age=SNAPSHOT_MAX_AGE, factory=InstrumentedConnection)
 
     def create_tabs(self):
         self.tab_students = ttk.Frame(self.tabControl)
@@ -42,33 +85,7 @@ class StudentManagementSystem:
         self.tabControl.add(self.tab_groups, text='Группы')
 
     def create_tables(self):
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS students (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                first_name TEXT, last_name TEXT, middle_name TEXT, birth_date TEXT,
-                phone TEXT, email TEXT, address TEXT, group_id INTEGER,
-                FOREIGN KEY(group_id) REFERENCES groups(id) ON DELETE SET NULL
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER, date TEXT, title TEXT, description TEXT, category TEXT,
-                FOREIGN KEY(student_id) REFERENCES students(id) ON DELETE CASCADE
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS education_periods (
-                student_id INTEGER, start_date TEXT, end_date TEXT, group_name TEXT,
-                FOREIGN KEY(student_id) REFERENCES students(id) ON DELETE CASCADE
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS groups (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, group_name TEXT
-            )
-        ''')
-        self.conn.commit()
+        migrate(self.conn)
 
     def create_widgets(self):
         self.create_student_widgets()
@@ -91,6 +108,9 @@ class StudentManagementSystem:
         self.import_excel_button = tk.Button(toolbar, text="Импорт из Excel", command=self.import_from_excel)
         self.import_excel_button.pack(side=tk.LEFT, padx=5)
 
+        self.sync_excel_button = tk.Button(toolbar, text="Синхронизация из Excel", command=self.sync_from_excel)
+        self.sync_excel_button.pack(side=tk.LEFT, padx=5)
+
         self.export_excel_button = tk.Button(toolbar, text="Экспорт в Excel", command=self.export_to_excel)
         self.export_excel_button.pack(side=tk.LEFT, padx=5)
 
@@ -99,13 +119,16 @@ class StudentManagementSystem:
 
         self.search_entry = tk.Entry(toolbar)
         self.search_entry.pack(side=tk.LEFT, padx=10, pady=5, fill=tk.X)
-        self.search_entry.bind('<KeyRelease>', self.search_item)
+        self.search_entry.bind('<KeyRelease>', self.schedule_search)
+        self.search_job = None
 
     def create_student_widgets(self):
         self.tree_students = self.create_treeview(self.tab_students,
                                                   ['ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения', 'Телефон',
                                                    'Email', 'Адрес', 'Группа'])
         self.tree_students.bind("<Button-3>", self.show_student_context_menu)
+        self.students_view = LazyTreeview(self.tree_students, self.tree_students.v_scrollbar,
+                                          self.fetch_students_page, self.fetch_student_row)
 
     def create_event_widgets(self):
         self.tree_events = self.create_treeview(self.tab_events,
@@ -131,36 +154,93 @@ class StudentManagementSystem:
         h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
         v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         treeview.pack(fill=tk.BOTH, expand=True)
+        treeview.v_scrollbar = v_scrollbar
 
         return treeview
 
-    def load_data(self):
-        self.groups = []
-        self.students = []
-        self.events = []
+    def setup_change_tracking(self):
+        prune_change_log(self.conn)
+        self.changes = ChangeTracker(self.conn)
+        self.changes.subscribe('students', self.apply_student_changes, self.load_students)
+        self.changes.subscribe('events', self.apply_event_changes, self.load_events)
+        self.changes.subscribe('groups', self.apply_group_changes, self.load_groups)
+        self.root.after(CHANGE_POLL_INTERVAL, self.poll_changes)
 
-        self.load_table_data(
-            "SELECT students.id, last_name, first_name, middle_name, birth_date, phone, email, address, group_name FROM students LEFT JOIN groups ON students.group_id = groups.id",
-            self.tree_students, self.students)
-        self.load_table_data("SELECT * FROM events", self.tree_events, self.events)
-        self.load_table_data("SELECT * FROM groups", self.tree_groups)
+    def poll_changes(self):
+        self.changes.poll()
+        self.root.after(CHANGE_POLL_INTERVAL, self.poll_changes)
 
-        # Загрузка списка групп
-        self.cursor.execute("SELECT id, group_name FROM groups")
-        self.groups = self.cursor.fetchall()
+    def load_data(self):
+        self.load_students()
+        self.load_events()
+        self.load_groups()
+
+    def load_students(self):
+        # Таблица студентов заполняется постранично по мере прокрутки
+        self.cursor.execute(STUDENTS_QUERY)
+        self.students.load(self.cursor)
+        self.students_view.reload()
+
+    def load_events(self):
+        self.load_table_data(EVENTS_QUERY, self.tree_events, self.events)
+
+    def load_groups(self):
+        self.load_table_data(GROUPS_QUERY, self.tree_groups, self.groups)
+
+    def apply_student_changes(self, student_ids):
+        for student_id in student_ids:
+            self.refresh_student(student_id)
+
+    def apply_event_changes(self, event_ids):
+        for event_id in event_ids:
+            self.cursor.execute(EVENTS_QUERY + ' WHERE id = ?', (event_id,))
+            self.apply_row_change(self.tree_events, self.events, event_id, self.cursor.fetchone())
+
+    def apply_group_changes(self, group_ids):
+        for group_id in group_ids:
+            self.cursor.execute(GROUPS_QUERY + ' WHERE id = ?', (group_id,))
+            self.apply_row_change(self.tree_groups, self.groups, group_id, self.cursor.fetchone())
+            # Название группы отображается в строках студентов, сами строки students при этом не меняются
+            self.cursor.execute('SELECT id FROM students WHERE group_id = ?', (group_id,))
+            self.apply_student_changes([row[0] for row in self.cursor.fetchall()])
+
+    def apply_row_change(self, treeview, data, row_id, row):
+        iid = str(row_id)
+        if row is None:
+            data.remove(row_id)
+            if treeview.exists(iid):
+                treeview.delete(iid)
+            return
+        row = data.put(row)
+        if treeview.exists(iid):
+            treeview.item(iid, values=row)
+        else:
+            treeview.insert('', 'end', iid=iid, values=row)
 
-    def load_table_data(self, query, treeview, data_list=None):
+    def load_table_data(self, query, treeview, data_store):
         self.cursor.execute(query)
-        data = self.cursor.fetchall()
-        self.update_treeview(treeview, data)
-        if data_list is not None:
-            data_list.clear()
-            data_list.extend(data)
+        data_store.load(self.cursor)
+        self.update_treeview(treeview, data_store)
+
+    def fetch_students_page(self, after_id, limit):
+        self.cursor.execute(STUDENTS_QUERY + ' WHERE students.id > ? ORDER BY students.id LIMIT ?', (after_id, limit))
+        return self.cursor.fetchall()
+
+    def fetch_student_row(self, student_id):
+        self.cursor.execute(STUDENTS_QUERY + ' WHERE students.id = ?', (student_id,))
+        return self.cursor.fetchone()
+
+    def refresh_student(self, student_id):
+        row = self.students_view.refresh(student_id)
+        if row is None:
+            self.students.remove(student_id)
+        else:
+            self.students.put(row)
 
     def update_treeview(self, treeview, data):
         treeview.delete(*treeview.get_children())
         for row in data:
-            treeview.insert('', 'end', values=row)
+            treeview.insert('', 'end', iid=str(row[0]), values=row)
 
     def add_item(self):
         tab = self.tabControl.select()
@@ -176,7 +256,8 @@ class StudentManagementSystem:
         if tab == self.tabControl.tabs()[0]:
             selected_item = self.tree_students.selection()
             if selected_item:
-                student_id = self.tree_students.item(selected_item)['values'][0]
+                # iid строки — это id студента, сама строка берётся из кэша без запроса к базе
+                student_id = int(selected_item[0])
                 self.open_student_window('Редактировать студента', self.get_student_by_id(student_id))
             else:
                 messagebox.showwarning("Предупреждение", "Пожалуйста, выберите элемент для редактирования.")
@@ -194,13 +275,25 @@ class StudentManagementSystem:
         elif tab == self.tabControl.tabs()[2]:
             self.delete_selected_item(self.tree_groups, "DELETE FROM groups WHERE id=?")
 
+    def schedule_search(self, event=None):
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DEBOUNCE, self.search_item)
+
     def search_item(self, event=None):
+        self.search_job = None
         query = self.search_entry.get().lower()
         tab = self.tabControl.select()
         if tab == str(self.tab_students):
-            self.search_in_treeview(query, self.students, self.tree_students)
+            if query.strip():
+                self.students_view.show_rows(search.search_students(self.conn, query))
+            else:
+                self.students_view.reload()
         elif tab == str(self.tab_events):
-            self.search_in_treeview(query, self.events, self.tree_events)
+            if query.strip():
+                self.update_treeview(self.tree_events, search.search_events(self.conn, query))
+            else:
+                self.update_treeview(self.tree_events, self.events)
         elif tab == str(self.tab_groups):
             self.search_in_treeview(query, self.groups, self.tree_groups)
 
@@ -253,12 +346,10 @@ class StudentManagementSystem:
             row=len(labels), column=0, columnspan=2, pady=10)
 
     def validate_email(self, email):
-        email_regex = re.compile(r"[^@]+@[^@]+\.[^@]+")
-        return email_regex.match(email) is not None
+        return validate_email(email)
 
     def validate_phone(self, phone):
-        phone_regex = re.compile(r"^\+?\d{10,15}$")
-        return phone_regex.match(phone) is not None
+        return validate_phone(phone)
 
     def validate_and_save(self, entries, save_command, window, record_id=None, student_id=None):
         for label, entry in entries.items():
@@ -303,7 +394,7 @@ class StudentManagementSystem:
             ''', (data['Имя'], data['Фамилия'], data['Отчество'], data['Дата рождения'], data['Телефон'], data['Email'],
                   data['Адрес'], group_id))
         self.conn.commit()
-        self.load_data()
+        self.changes.poll()
         window.destroy()
 
     def save_event(self, entries, window, event_id=None, student_id=None):
@@ -317,7 +408,7 @@ class StudentManagementSystem:
                 INSERT INTO events (student_id, date, title, description, category) VALUES (?, ?, ?, ?, ?)
             ''', (student_id, data['Дата'], data['Название'], data['Описание'], data['Категория']))
         self.conn.commit()
-        self.load_data()
+        self.changes.poll()
         window.destroy()
 
     def save_group(self, group_name, window, group_id=None):
@@ -329,7 +420,7 @@ class StudentManagementSystem:
         else:
             self.cursor.execute('INSERT INTO groups (group_name) VALUES (?)', (group_name,))
         self.conn.commit()
-        self.load_data()
+        self.changes.poll()
         window.destroy()
 
     def check_unique_email(self, email, student_id=None):
@@ -357,6 +448,7 @@ class StudentManagementSystem:
             self.cursor.execute(query, (values[0],))
             self.conn.commit()
             treeview.delete(selected_item)
+            self.changes.poll()
         else:
             messagebox.showwarning("Предупреждение", "Пожалуйста, выберите элемент для удаления.")
 
@@ -427,16 +519,20 @@ class StudentManagementSystem:
             self.cursor.execute("DELETE FROM events WHERE id=?", (values[0],))
             self.conn.commit()
             treeview.delete(selected_item)
+            self.changes.poll()
         else:
             messagebox.showwarning("Предупреждение", "Пожалуйста, выберите событие для удаления.")
 
-    def search_in_treeview(self, query, data, treeview, column=None):
+    def filter_rows(self, query, data, column=None):
         results = []
         for item in data:
             if any(query in str(value).lower() for value in item) if column is None else query in str(
                     item[column]).lower():
                 results.append(item)
-        self.update_treeview(treeview, results)
+        return results
+
+    def search_in_treeview(self, query, data, treeview, column=None):
+        self.update_treeview(treeview, self.filter_rows(query, data, column))
 
     def generate_group_report(self):
         window = tk.Toplevel(self.root)
@@ -464,69 +560,193 @@ class StudentManagementSystem:
             messagebox.showwarning("Ошибка", "Пожалуйста, заполните все поля.")
             return
 
-        try:
-            self.cursor.execute('''
-                SELECT s.id, s.first_name, s.last_name, s.middle_name, e.date, e.title, e.description, e.category
-                FROM students s
-                JOIN events e ON s.id = e.student_id
-                JOIN groups g ON s.group_id = g.id
-                WHERE g.group_name = ? AND e.date >= ? AND e.date <= ?
-            ''', (group_name, start_date, end_date))
-            report_data = self.cursor.fetchall()
-        except sqlite3.Error as e:
-            messagebox.showerror("Ошибка базы данных", f"Ошибка: {e}")
-            return
+        def finished(summary):
+            if not summary['by_category']:
+                messagebox.showinfo("Информация", "Нет данных для указанного периода.")
+                return
+            self.show_group_report(group_name, start_date, end_date, summary)
+            if window.winfo_exists():
+                window.destroy()
 
-        if not report_data:
-            messagebox.showinfo("Информация", "Нет данных для указанного периода.")
-            return
+        def failed(error):
+            if isinstance(error, InvalidDateError):
+                messagebox.showerror("Ошибка", f"Некорректная дата: {error}")
+            else:
+                messagebox.showerror("Ошибка базы данных", f"Ошибка: {error}")
 
+        self.run_task("Отчёт по группе",
+                      lambda conn, task: reports.summary(conn, group_name, start_date, end_date),
+                      on_done=finished, on_error=failed, source=self.snapshot)
+
+    def show_group_report(self, group_name, start_date, end_date, summary):
         report_window = tk.Toplevel(self.root)
         report_window.title(f"Отчёт по группе {group_name} за период с {start_date} по {end_date}")
-        tree_report = self.create_treeview(report_window,
-                                           ['ID студента', 'Фамилия', 'Имя', 'Отчество', 'Дата события', 'Название',
-                                            'Описание', 'Категория'])
-        for row in report_data:
-            tree_report.insert('', 'end', values=row)
+        notebook = ttk.Notebook(report_window)
+        notebook.pack(expand=1, fill="both")
+
+        # Сводки читаются из предрассчитанной таблицы event_daily_counts
+        tab_periods = ttk.Frame(notebook)
+        notebook.add(tab_periods, text='По месяцам')
+        tree_periods = self.create_treeview(tab_periods, ['Месяц', 'Категория', 'Событий'])
+        for row in summary['by_period']:
+            tree_periods.insert('', 'end', values=tuple(row))
+
+        tab_students = ttk.Frame(notebook)
+        notebook.add(tab_students, text='По студентам')
+        tree_students = self.create_treeview(tab_students, ['ID студента', 'Фамилия', 'Имя', 'Отчество', 'Событий'])
+        for row in summary['by_student']:
+            tree_students.insert('', 'end', values=tuple(row))
+
+        # Подробный список событий подгружается страницами при прокрутке
+        tab_events = ttk.Frame(notebook)
+        notebook.add(tab_events, text='События')
+        tree_report = self.create_treeview(tab_events,
+                                           ['ID события', 'ID студента', 'Фамилия', 'Имя', 'Отчество',
+                                            'Дата события', 'Название', 'Описание', 'Категория'])
+        def fetch_detail(after_id, limit):
+            # Копия уже обновлена задачей отчёта; в Tk-потоке её не пересоздаём
+            with self.snapshot.connection(max_age=float('inf')) as conn:
+                return reports.detail(conn, group_name, start_date, end_date, after_id, limit)
+
+        report_view = LazyTreeview(tree_report, tree_report.v_scrollbar, fetch_detail, lambda event_id: None)
+        report_view.reload()
         tk.Button(report_window, text="Закрыть", command=report_window.destroy).pack(pady=10)
-        window.destroy()
+
+    def run_task(self, title, func, *args, on_done, on_error=None, on_cancel=None, progress_text=None, source=None):
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        status_label = tk.Label(window, text="Подготовка...")
+        status_label.pack(padx=10, pady=5)
+        # Пока задача не сообщила общий объём работы, индикатор просто показывает активность
+        progress_bar = ttk.Progressbar(window, length=300, mode='indeterminate')
+        progress_bar.pack(padx=10, pady=10)
+        progress_bar.start(10)
+        cancel_button = tk.Button(window, text="Отмена")
+        cancel_button.pack(pady=5)
+
+        def on_progress(done, total):
+            if total is not None and str(progress_bar['mode']) != 'determinate':
+                progress_bar.stop()
+                progress_bar.config(mode='determinate')
+            if total is not None:
+                progress_bar['maximum'] = max(total, 1)
+                progress_bar['value'] = done
+            if progress_text is not None:
+                status_label.config(text=progress_text(done, total))
+
+        def finish(handler):
+            def callback(payload):
+                window.destroy()
+                handler(payload)
+            return callback
+
+        def show_error(error):
+            messagebox.showerror(f"{title}: ошибка", str(error))
+
+        def show_cancelled(_):
+            messagebox.showinfo(title, "Операция отменена.")
+
+        task = self.tasks.submit(title, func, *args, on_done=finish(on_done), on_error=finish(on_error or show_error),
+                                 on_cancel=finish(on_cancel or show_cancelled), on_progress=on_progress,
+                                 source=source)
+
+        def cancel():
+            task.cancel()
+            cancel_button.config(state='disabled')
+            status_label.config(text="Отмена...")
+
+        cancel_button.config(command=cancel)
+        window.protocol("WM_DELETE_WINDOW", cancel)
+        return task
 
     def import_from_excel(self):
         file_path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
         if file_path:
-            data = self.parse_excel(file_path)
-            self.import_data(data)
+            self.import_data(file_path)
 
-    def import_data(self, data):
-        for student in data:
-            self.cursor.execute('''
-                INSERT INTO students (first_name, last_name, middle_name, birth_date, phone, email, address, group_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (student['Имя'], student['Фамилия'], student['Отчество'], student['Дата рождения'],
-                  student['Телефон'], student['Email'], student['Адрес'], self.get_group_id(student['Группа'])))
-        self.conn.commit()
-        self.load_data()
+    def import_data(self, file_path):
+        def finished(report):
+            self.changes.poll()
+            if report.errors:
+                messagebox.showwarning("Импорт завершён с ошибками", report.summary())
+            else:
+                messagebox.showinfo("Импорт завершён", report.summary())
+
+        def cancelled(_):
+            # Пакеты фиксируются по отдельности, поэтому уже загруженные строки остаются в базе
+            self.changes.poll()
+            messagebox.showinfo("Импорт отменён", "Импорт прерван, уже загруженные записи сохранены.")
+
+        self.run_task("Импорт", self.run_import, file_path, on_done=finished, on_cancel=cancelled,
+                      progress_text=lambda done, total: f"Обработано строк: {done}")
+
+    def run_import(self, conn, task, file_path):
+        return excel_io.import_students(conn, self.parse_excel(file_path), progress=task.progress)
+
+    def sync_from_excel(self):
+        file_path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
+        if file_path:
+            self.sync_data(file_path, dry_run=True)
+
+    def sync_data(self, file_path, dry_run):
+        # Сначала пробный прогон: пользователь видит, сколько строк добавится и изменится, и подтверждает запись
+        def finished(report):
+            if dry_run:
+                if not report.inserted and not report.updated:
+                    messagebox.showinfo("Синхронизация", report.summary())
+                elif messagebox.askyesno("Синхронизация", report.summary() + "\n\nПрименить изменения?"):
+                    self.sync_data(file_path, dry_run=False)
+                return
+            self.changes.poll()
+            if report.errors:
+                messagebox.showwarning("Синхронизация завершена с ошибками", report.summary())
+            else:
+                messagebox.showinfo("Синхронизация завершена", report.summary())
+
+        def cancelled(_):
+            if not dry_run:
+                self.changes.poll()
+            messagebox.showinfo("Синхронизация отменена", "Синхронизация прервана, уже записанные пакеты сохранены.")
+
+        self.run_task("Проверка файла" if dry_run else "Синхронизация", self.run_sync, file_path, dry_run,
+                      on_done=finished, on_cancel=cancelled,
+                      progress_text=lambda done, total: f"Обработано строк: {done}")
+
+    def run_sync(self, conn, task, file_path, dry_run):
+        return excel_io.sync_students(conn, self.parse_excel(file_path), dry_run=dry_run, progress=task.progress)
 
     def parse_excel(self, file_path):
-        workbook = load_workbook(filename=file_path)
-        worksheet = workbook.active
-        headers = [cell.value for cell in worksheet[1]]
-        return [{headers[i]: cell.value for i, cell in enumerate(row)} for row in worksheet.iter_rows(min_row=2)]
+        return excel_io.iter_excel_rows(file_path)
 
     def export_to_excel(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")])
+        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                                 filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                                                            ("Parquet files", "*.parquet")])
         if file_path:
-            self.write_excel(file_path, self.students)
+            self.run_export(file_path)
+
+    def run_export(self, file_path):
+        try:
+            export_format = excel_io.format_from_path(file_path)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+
+        self.run_task("Экспорт", self.write_export, file_path, export_format,
+                      on_done=lambda total: messagebox.showinfo("Экспорт завершён", f"Выгружено записей: {total}"),
+                      progress_text=lambda done, total: f"Выгружено {done} из {total}", source=self.snapshot)
+
+    def write_export(self, conn, task, file_path, export_format):
+        try:
+            return excel_io.export_students(conn, file_path, export_format, progress=task.progress)
+        except Exception:
+            # Недописанный файл после отмены или ошибки не оставляем
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
 
     def write_excel(self, file_path, data):
-        workbook = Workbook()
-        worksheet = workbook.active
-        headers = data[0].keys() if isinstance(data[0], dict) else ['ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения',
-                                                                    'Телефон', 'Email', 'Адрес', 'Группа']
-        worksheet.append(headers)
-        for row in data:
-            worksheet.append(row.values() if isinstance(row, dict) else row)
-        workbook.save(file_path)
+        excel_io.write_xlsx(file_path, excel_io.EXPORT_HEADERS, [data])
 
     def get_group_id(self, group_name):
         self.cursor.execute('SELECT id FROM groups WHERE group_name = ?', (group_name,))
@@ -534,38 +754,35 @@ class StudentManagementSystem:
         return group[0] if group else None
 
     def get_student_by_id(self, student_id):
-        self.cursor.execute("SELECT * FROM students WHERE id=?", (student_id,))
-        return self.cursor.fetchone()
+        student = self.students.get(student_id)
+        if student is None:
+            # Строка могла появиться в базе позже последнего опроса журнала изменений
+            student = self.fetch_student_row(student_id)
+            if student is not None:
+                student = self.students.put(student)
+        return student
 
     def setup_api(self):
-        app = Flask(__name__)
-
-        @app.route('/api/students', methods=['GET'])
-        def get_students():
-            self.cursor.execute("SELECT * FROM students")
-            return jsonify(self.cursor.fetchall())
-
-        @app.route('/api/events', methods=['GET'])
-        def get_events():
-            self.cursor.execute("SELECT * FROM events")
-            return jsonify(self.cursor.fetchall())
-
-        @app.route('/api/students/<int:student_id>/events', methods=['GET'])
-        def get_student_events(student_id):
-            self.cursor.execute("SELECT * FROM events WHERE student_id=?", (student_id,))
-            return jsonify(self.cursor.fetchall())
-
-        @app.route('/api/groups', methods=['GET'])
-        def get_groups():
-            self.cursor.execute("SELECT * FROM groups")
-            return jsonify(self.cursor.fetchall())
-
-        self.api_app = app
-        self.api_thread = Thread(target=self.api_app.run, kwargs={'port': 5000})
-        self.api_thread.start()
-
+        # По умолчанию API работает отдельным процессом (serve.py); встроенный сервер — по STUDENT_API_EMBEDDED=1
+        self.api_server = None
+        if os.environ.get('STUDENT_API_EMBEDDED') != '1':
+            return
+        # Встроенный API только читает, поэтому кэш сбрасывается по журналу изменений
+        self.api_cache = cache.ResponseCache()
+        self.changes.subscribe_all(self.api_cache.clear)
+        self.api_app = desktop_api.create_app(self.pool, self.api_cache)
+        self.api_server = BackgroundServer(self.api_app, port=5000).start()
+
+    def close(self):
+        if self.api_server is not None:
+            self.api_server.stop()
+        self.tasks.shutdown()
+        self.snapshot.stop()
+        self.pool.release(self.conn)
+        self.pool.close()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = StudentManagementSystem(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.close()
\ No newline at end of file
@@ -0,0 +1,113 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Сколько тяжёлых операций (импорт, экспорт, отчёты) может выполняться одновременно
+TASK_WORKERS = 2
+# Как часто Tk-поток забирает результаты и прогресс из очереди, мс
+TASK_POLL_INTERVAL = 100
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    def __init__(self, name, results):
+        self.name = name
+        self.results = results
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.conn = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def attach(self, conn):
+        with self.lock:
+            self.conn = conn
+
+    def cancel(self):
+        self.cancel_event.set()
+        # interrupt прерывает запрос, который уже выполняется в соединении задачи
+        with self.lock:
+            if self.conn is not None:
+                self.conn.interrupt()
+
+    def check(self):
+        if self.cancelled:
+            raise TaskCancelled(self.name)
+
+    def progress(self, done, total=None):
+        # Вызывается из рабочего потока; заодно служит точкой проверки отмены
+        self.check()
+        self.results.put((self, 'progress', (done, total)))
+
+
+class TaskRunner:
+    def __init__(self, root, pool, max_workers=TASK_WORKERS, poll_interval=TASK_POLL_INTERVAL):
+        self.root = root
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gui-task')
+        self.results = queue.Queue()
+        self.handlers = {}
+        self.poll_job = None
+
+    def submit(self, name, func, *args, on_done=None, on_error=None, on_progress=None, on_cancel=None, source=None):
+        # func(conn, task, *args) выполняется в рабочем потоке со своим соединением из пула (или из source —
+        # например, реплики для чтения с тем же connection()); колбэки вызываются в Tk-потоке
+        task = Task(name, self.results)
+        self.handlers[task] = {'done': on_done, 'error': on_error, 'progress': on_progress, 'cancelled': on_cancel}
+        self.executor.submit(self.run_task, task, func, args, source or self.pool)
+        if self.poll_job is None:
+            self.poll_job = self.root.after(self.poll_interval, self.poll)
+        return task
+
+    def run_task(self, task, func, args, source):
+        try:
+            task.check()
+            with source.connection() as conn:
+                task.attach(conn)
+                try:
+                    result = func(conn, task, *args)
+                finally:
+                    task.attach(None)
+            self.results.put((task, 'done', result))
+        except TaskCancelled:
+            self.results.put((task, 'cancelled', None))
+        except sqlite3.OperationalError as e:
+            self.results.put((task, 'cancelled' if task.cancelled else 'error', e))
+        except Exception as e:
+            self.results.put((task, 'error', e))
+
+    def poll(self):
+        self.poll_job = None
+        while True:
+            try:
+                task, kind, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+            handlers = self.handlers.get(task)
+            if handlers is None:
+                continue
+            if kind == 'progress':
+                if handlers['progress'] is not None:
+                    handlers['progress'](*payload)
+                continue
+            del self.handlers[task]
+            if handlers[kind] is not None:
+                handlers[kind](payload)
+        if self.handlers:
+            self.poll_job = self.root.after(self.poll_interval, self.poll)
+
+    def cancel_all(self):
+        for task in list(self.handlers):
+            task.cancel()
+
+    def shutdown(self):
+        # Вызывается после выхода из mainloop: колбэки уже не нужны, ждём только остановки потоков
+        self.cancel_all()
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+# Модули лежат в корне репозитория, пакета нет
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import connect, migrate  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    import api
+    return api.create_app({'DATABASE': str(tmp_path / 'api.db'), 'SNAPSHOT_MODE': 'live', 'TESTING': True})
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'test.db'))
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def add_student(conn, index, birth_date='01.09.2004', group_id=None):
+    cursor = conn.execute('''
+        INSERT INTO students (first_name, last_name, middle_name, birth_date, phone, email, address, group_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (f'Имя{index}', f'Фамилия{index}', None, birth_date, f'+7900000{index:04d}', f'student{index}@example.edu',
+          None, group_id))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def add_event(conn, student_id, day, category='Учёба', title='Событие'):
+    cursor = conn.execute('INSERT INTO events (student_id, date, title, description, category) VALUES (?, ?, ?, ?, ?)',
+                          (student_id, day, title, None, category))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def student_item(index, **overrides):
+    item = {'first_name': f'Имя{index}', 'last_name': f'Фамилия{index}', 'middle_name': None,
+            'birth_date': '2004-09-01', 'phone': f'+7911000{index:04d}', 'email': f'batch{index}@example.edu',
+            'address': None}
+    item.update(overrides)
+    return item
+
+
+def seed_students(client, count):
+    response = client.post('/students/batch', json=[student_item(index) for index in range(count)])
+    assert response.status_code == 200
+    return [result['id'] for result in response.json['results']]
+
+
+def seed_events(client, items):
+    response = client.post('/events/batch', json=items)
+    assert response.status_code == 200
+    return [result['id'] for result in response.json['results']]
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from archive import archive_events, archive_path, attached_archives, compact, events_source, restore_year
+from conftest import add_event, add_student, seed_events, seed_students
+from db import ConnectionPool
+
+
+def counts(conn):
+    return conn.execute('SELECT student_id, day, category, count FROM event_daily_counts ORDER BY 1, 2, 3').fetchall()
+
+
+def events(conn, source='main.events'):
+    return conn.execute(f'SELECT id, student_id, date, title, category FROM {source} ORDER BY id').fetchall()
+
+
+@pytest.fixture
+def history(conn):
+    student_id = add_student(conn, 1)
+    for day in ('15.10.2021', '20.03.2022', '05.10.2022', '01.12.2024'):
+        add_event(conn, student_id, day)
+    return student_id
+
+
+def test_archive_and_restore_round_trip(conn, history):
+    before_events, before_counts = events(conn), counts(conn)
+
+    moved = archive_events(conn, '2023-09-01')
+    assert moved == {2021: 2, 2022: 1}
+    assert [row[2] for row in events(conn)] == ['01.12.2024']
+    # Агрегаты отчётов не меняются от переноса
+    assert counts(conn) == before_counts
+    paths = dict(conn.execute('SELECT academic_year, path FROM event_archives'))
+    assert all(os.path.exists(archive_path(conn, path)) for path in paths.values())
+
+    # Диапазон дат, задевающий архивы, читает их вместе с основной таблицей
+    source = events_source(conn, '2021-01-01', '2025-01-01')
+    assert events(conn, source) == before_events
+    assert events_source(conn) == 'main.events'
+
+    assert restore_year(conn, 2021) == 2
+    assert restore_year(conn, 2022) == 1
+    assert events(conn) == before_events
+    assert counts(conn) == before_counts
+    assert conn.execute('SELECT COUNT(*) FROM event_archives').fetchone()[0] == 0
+    assert not any(os.path.exists(archive_path(conn, path)) for path in paths.values())
+
+
+def test_restore_skips_deleted_students(conn, history):
+    other_id = add_student(conn, 2)
+    add_event(conn, other_id, '01.11.2021')
+    archive_events(conn, '2023-09-01')
+    with conn:
+        conn.execute('DELETE FROM students WHERE id = ?', (other_id,))
+
+    assert restore_year(conn, 2021) == 2
+    assert conn.execute('SELECT events FROM event_archives WHERE academic_year = 2021').fetchone()[0] == 1
+
+    # Событие удалённого студента остаётся в архиве, пока его не вычистит compact
+    compact(conn)
+    assert conn.execute('SELECT events FROM event_archives WHERE academic_year = 2021').fetchone()[0] == 0
+    assert {row[0] for row in counts(conn)} == {history}
+
+
+def test_restore_unknown_year(conn):
+    with pytest.raises(ValueError):
+        restore_year(conn, 1999)
+
+
+def test_pooled_connections_release_archives(conn, history, tmp_path):
+    archive_events(conn, '2023-09-01')
+    pool = ConnectionPool(str(tmp_path / 'test.db'), max_size=1)
+    with pool.connection() as reader:
+        source = events_source(reader, '2021-01-01', '2025-01-01')
+        assert len(events(reader, source)) == 4
+        assert attached_archives(reader)
+    with pool.connection() as reused:
+        assert reused is reader
+        assert attached_archives(reused) == set()
+    # Читатели не держат файл: архив можно вернуть и удалить
+    assert restore_year(conn, 2021) == 2
+    pool.close()
+
+
+def test_api_reads_archives_without_keeping_them_attached(client, app):
+    student_id = seed_students(client, 1)[0]
+    seed_events(client, [{'student_id': student_id, 'date': day, 'title': day}
+                         for day in ('2021-10-15', '2024-12-01')])
+    with app.extensions['db_pool'].connection() as conn:
+        archive_events(conn, '2023-09-01')
+
+    assert [item['title'] for item in client.get('/events').json['items']] == ['2024-12-01']
+    response = client.get('/events?from=2021-09-01&to=2025-01-01')
+    assert [item['title'] for item in response.json['items']] == ['2021-10-15', '2024-12-01']
+    streamed = client.get('/events?from=2021-09-01&to=2025-01-01&stream=1').get_data(as_text=True)
+    assert len(streamed.splitlines()) == 2
+
+    pool = app.extensions['db_pool']
+    with pool.connection() as conn:
+        assert attached_archives(conn) == set()
+        assert restore_year(conn, 2021) == 1
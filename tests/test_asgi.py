@@ -0,0 +1,107 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from asgi_api import create_app, fetch_event_changes
+from conftest import add_event, add_student, student_item
+
+
+@pytest.fixture
+def asgi_app(tmp_path):
+    return create_app({'DATABASE': str(tmp_path / 'test.db'), 'DB_THREADS': 2, 'TESTING': True})
+
+
+def serve(app, scenario):
+    # pytest-asyncio не установлен: каждый сценарий запускается в своём event loop
+    async def run():
+        async with app.test_app() as test_app:
+            return await scenario(test_app.test_client())
+    return asyncio.run(run())
+
+
+def test_student_crud(asgi_app):
+    async def scenario(client):
+        response = await client.post('/students', json=student_item(1))
+        assert response.status_code == 201
+        student_id = (await response.get_json())['id']
+
+        response = await client.put(f'/students/{student_id}', json=student_item(1, address='ул. Ленина, 1'))
+        assert response.status_code == 200
+        response = await client.get(f'/students/{student_id}')
+        assert (await response.get_json())['address'] == 'ул. Ленина, 1'
+
+        assert (await client.delete(f'/students/{student_id}')).status_code == 200
+        assert (await client.get(f'/students/{student_id}')).status_code == 404
+        assert (await client.put(f'/students/{student_id}', json=student_item(1))).status_code == 404
+
+    serve(asgi_app, scenario)
+
+
+def test_list_pages_with_cursor(asgi_app):
+    async def scenario(client):
+        for index in range(3):
+            await client.post('/students', json=student_item(index))
+        first = await (await client.get('/students?limit=2&fields=id,email')).get_json()
+        assert [set(item) for item in first['items']] == [{'id', 'email'}] * 2
+        second = await (await client.get(f"/students?limit=2&after_id={first['next_cursor']}")).get_json()
+        assert len(second['items']) == 1
+        assert second['next_cursor'] is None
+
+    serve(asgi_app, scenario)
+
+
+@pytest.mark.parametrize('query', ['limit=abc', 'after_id=x', 'fields=password'])
+def test_list_rejects_bad_arguments(asgi_app, query):
+    async def scenario(client):
+        return (await client.get(f'/students?{query}')).status_code
+
+    assert serve(asgi_app, scenario) == 400
+
+
+def test_write_errors(asgi_app):
+    async def scenario(client):
+        await client.post('/students', json=student_item(1))
+        duplicate = await client.post('/students', json=student_item(2, phone=student_item(1)['phone']))
+        invalid = await client.post('/students', json=student_item(3, email='bad'))
+        bad_date = await client.post('/students', json=student_item(4, birth_date='весна 2004'))
+        return duplicate.status_code, invalid.status_code, bad_date.status_code
+
+    assert serve(asgi_app, scenario) == (409, 400, 400)
+
+
+def test_fetch_event_changes(conn):
+    conn.row_factory = sqlite3.Row
+    student_id = add_student(conn, 1)
+    event_id = add_event(conn, student_id, '01.10.2024', title='Сессия')
+    with conn:
+        conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
+
+    changes = fetch_event_changes(conn, 0)
+    assert [operation for _, operation, _ in changes] == ['insert', 'delete']
+    # Удалённое событие больше не читается: в ленте остаётся только id
+    assert [data for _, _, data in changes] == [{'id': event_id}, {'id': event_id}]
+    assert fetch_event_changes(conn, changes[0][0]) == changes[1:]
+
+
+def test_change_feed_replays_backlog(asgi_app, tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'test.db'))
+    student_id = add_student(conn, 1)
+    add_event(conn, student_id, '01.10.2024', title='Сессия')
+    add_event(conn, student_id, '02.10.2024', title='Экзамен')
+    conn.close()
+
+    async def scenario(client):
+        async with client.request('/events/changes', headers={'Last-Event-ID': '1'}) as connection:
+            await connection.send_complete()
+            received = ''
+            while received.count('\n\n') < 2:
+                received += (await connection.receive()).decode()
+            await connection.disconnect()
+        return received
+
+    messages = serve(asgi_app, scenario).split('\n\n')
+    assert messages[0].startswith('id: 2\nevent: insert\n')
+    assert '"title": "Сессия"' in messages[0]
+    assert messages[1].startswith('id: 3\nevent: insert\n')
+    assert '"title": "Экзамен"' in messages[1]
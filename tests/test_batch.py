@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+import batch
+from batch import (EVENT_WRITE_FIELDS, STUDENT_WRITE_FIELDS, BatchError, run_batch, validate_event,
+                   validate_student)
+from conftest import add_student, student_item
+
+
+def create_students(conn, items, mode):
+    return run_batch(conn, 'create', 'students', STUDENT_WRITE_FIELDS, validate_student, items, mode)
+
+
+def count(conn, table):
+    return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_atomic_create_assigns_ids(conn):
+    committed, results = create_students(conn, [student_item(1), student_item(2)], 'atomic')
+    assert committed
+    assert [result['status'] for result in results] == ['created', 'created']
+    ids = [row[0] for row in conn.execute('SELECT id FROM students WHERE email LIKE ? ORDER BY id', ('batch%',))]
+    assert [result['id'] for result in results] == ids
+
+
+def test_atomic_validation_error_writes_nothing(conn):
+    committed, results = create_students(conn, [student_item(1), student_item(2, email='bad')], 'atomic')
+    assert not committed
+    assert [result['status'] for result in results] == ['skipped', 'error']
+    assert count(conn, 'students') == 0
+
+
+def test_atomic_unique_conflict_reports_item(conn):
+    add_student(conn, 1)
+    existing_phone = conn.execute('SELECT phone FROM students').fetchone()[0]
+    items = [student_item(1), student_item(2, phone=existing_phone), student_item(3)]
+    committed, results = create_students(conn, items, 'atomic')
+    assert not committed
+    assert [result['status'] for result in results] == ['skipped', 'error', 'skipped']
+    assert 'UNIQUE' in results[1]['message']
+    assert all(result['id'] is None for result in results)
+    assert count(conn, 'students') == 1
+    assert not conn.in_transaction
+
+
+def test_atomic_foreign_key_conflict_rolls_back(conn):
+    student_id = add_student(conn, 1)
+    items = [{'student_id': student_id, 'date': '2024-10-01', 'title': 'Сессия'},
+             {'student_id': student_id + 100, 'date': '2024-10-02', 'title': 'Сессия'}]
+    committed, results = run_batch(conn, 'create', 'events', EVENT_WRITE_FIELDS, validate_event, items, 'atomic')
+    assert not committed
+    assert [result['status'] for result in results] == ['skipped', 'error']
+    assert 'FOREIGN KEY' in results[1]['message']
+    assert count(conn, 'events') == 0
+    assert count(conn, 'event_daily_counts') == 0
+
+
+def test_best_effort_commits_valid_items(conn):
+    add_student(conn, 1)
+    existing_phone = conn.execute('SELECT phone FROM students').fetchone()[0]
+    items = [student_item(1), student_item(2, phone=existing_phone), student_item(3, email='bad')]
+    committed, results = create_students(conn, items, 'best_effort')
+    assert committed
+    assert [result['status'] for result in results] == ['created', 'error', 'error']
+    assert conn.execute('SELECT email FROM students WHERE id = ?', (results[0]['id'],)).fetchone()[0] == \
+        'batch1@example.edu'
+    assert count(conn, 'students') == 2
+
+
+def test_update_and_delete_report_missing_ids(conn):
+    student_id = add_student(conn, 1)
+    committed, results = run_batch(conn, 'update', 'students', STUDENT_WRITE_FIELDS, validate_student,
+                                   [student_item(5, id=student_id), student_item(6, id=student_id + 1)],
+                                   'best_effort')
+    assert committed
+    assert [result['status'] for result in results] == ['updated', 'error']
+    assert results[1]['message'] == 'not found'
+    assert conn.execute('SELECT email FROM students WHERE id = ?', (student_id,)).fetchone()[0] == 'batch5@example.edu'
+
+    committed, results = run_batch(conn, 'delete', 'students', [], None, [student_id, student_id + 1], 'atomic')
+    assert not committed
+    assert [result['status'] for result in results] == ['skipped', 'error']
+    assert count(conn, 'students') == 1
+
+
+def test_rows_cannot_vanish_between_check_and_write(conn, tmp_path, monkeypatch):
+    student_id = add_student(conn, 1)
+    other = sqlite3.connect(str(tmp_path / 'test.db'), timeout=0)
+    check = batch.existing_ids
+
+    def racing_check(*args):
+        found = check(*args)
+        # Другой процесс удаляет строку сразу после проверки; пакет держит блокировку записи, удаление ждёт
+        try:
+            with other:
+                other.execute('DELETE FROM students WHERE id = ?', (student_id,))
+        except sqlite3.OperationalError:
+            pass
+        return found
+
+    monkeypatch.setattr(batch, 'existing_ids', racing_check)
+    committed, results = run_batch(conn, 'update', 'students', STUDENT_WRITE_FIELDS, validate_student,
+                                   [student_item(5, id=student_id)], 'atomic')
+    other.close()
+    assert committed
+    assert results[0]['status'] == 'updated'
+    assert conn.execute('SELECT email FROM students WHERE id = ?', (student_id,)).fetchone() == ('batch5@example.edu',)
+
+
+@pytest.mark.parametrize('items, mode', [({}, 'atomic'), ([], 'sometimes')])
+def test_rejects_malformed_batch(conn, items, mode):
+    with pytest.raises(BatchError):
+        create_students(conn, items, mode)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from cache import ResponseCache
+
+STUDENT = {'first_name': 'Иван', 'last_name': 'Иванов', 'middle_name': None, 'birth_date': '2004-09-01',
+           'phone': '+79000000001', 'email': 'ivan@example.edu', 'address': None}
+
+
+@pytest.fixture
+def response_cache(app):
+    return app.extensions['response_cache']
+
+
+def test_second_request_is_a_hit(client, response_cache):
+    first = client.get('/students')
+    second = client.get('/students')
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert second.data == first.data
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert response_cache.stats()['hits'] == 1
+
+
+def test_etag_revalidation(client, response_cache):
+    etag = client.get('/students').headers['ETag']
+    response = client.get('/students', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response_cache.stats()['not_modified'] == 1
+
+
+def test_last_modified_moves_only_with_data(client, response_cache):
+    client.get('/students')
+    # Данные изменились минуту назад: запись, заново построенная без новых изменений, сохраняет это время
+    for version in response_cache.versions:
+        response_cache.versions[version] -= timedelta(minutes=1)
+    response_cache.clear()
+    first = client.get('/students')
+    last_modified = first.headers['Last-Modified']
+    assert datetime.now(timezone.utc) - first.last_modified >= timedelta(seconds=59)
+    assert client.get('/students', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    assert client.post('/students', json=STUDENT).status_code == 201
+    response = client.get('/students', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    assert len(response.json['items']) == 1
+    assert response.last_modified > first.last_modified
+
+
+def test_older_version_never_looks_newer():
+    response_cache = ResponseCache()
+    newer = response_cache.modified_at(5)
+    assert response_cache.modified_at(3) <= newer
+    assert response_cache.modified_at(5) == newer
+
+
+@pytest.mark.parametrize('method, path', [('POST', '/students'), ('PUT', '/students/1'),
+                                          ('DELETE', '/students/1')])
+def test_writes_invalidate_listing(client, method, path):
+    assert client.post('/students', json=dict(STUDENT, phone='+79000000002', email='other@example.edu')).status_code \
+        == 201
+    client.get('/students')
+    client.get('/students/1')
+    assert client.get('/students').headers['X-Cache'] == 'HIT'
+    body = dict(STUDENT, birth_date='2004-09-02')
+    assert client.open(path, method=method, json=body).status_code < 400
+    assert client.get('/students').headers['X-Cache'] == 'MISS'
+    assert client.get('/students/1').headers.get('X-Cache') in ('MISS', None)
+
+
+def test_failed_write_keeps_cache(client):
+    client.get('/students')
+    assert client.post('/students/batch', json={}).status_code == 400
+    assert client.get('/students').headers['X-Cache'] == 'HIT'
+
+
+def test_variants_keyed_by_accept_and_args(client):
+    client.get('/students')
+    assert client.get('/students', headers={'Accept': 'application/json'}).headers['X-Cache'] == 'MISS'
+    assert client.get('/students?limit=5').headers['X-Cache'] == 'MISS'
+    assert client.get('/students?limit=5').headers['X-Cache'] == 'HIT'
+
+
+def test_streams_are_not_cached(client):
+    response = client.get('/students?stream=1')
+    assert 'X-Cache' not in response.headers
+    assert client.get('/students?stream=1').headers.get('X-Cache') is None
+
+
+def test_expired_entry_is_a_miss(client, response_cache):
+    client.get('/students')
+    entry = next(iter(response_cache.entries.values()))
+    entry.expires_at -= response_cache.ttl + 1
+    assert client.get('/students').headers['X-Cache'] == 'MISS'
+
+
+def test_last_modified_is_an_http_date(client):
+    last_modified = client.get('/students').last_modified
+    assert last_modified.tzinfo is not None
+    assert datetime.now(timezone.utc) - last_modified < timedelta(minutes=1)
+
+
+@pytest.mark.parametrize('path, resource', [('/students', '/api/students'), ('/events', '/api/events')])
+def test_writes_invalidate_desktop_routes(client, path, resource):
+    assert client.post('/students', json=STUDENT).status_code == 201
+    assert len(client.get(resource).json) == (1 if resource == '/api/students' else 0)
+    assert client.get(resource).headers['X-Cache'] == 'HIT'
+    if path == '/students':
+        client.post(path, json=dict(STUDENT, phone='+79000000002', email='other@example.edu'))
+    else:
+        client.post(path, json={'student_id': 1, 'date': '2024-10-01', 'title': 'Сессия', 'description': None,
+                                'category': 'Учёба'})
+    response = client.get(resource)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert len(response.json) == (2 if resource == '/api/students' else 1)
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+from flask import Flask
+
+import db
+from db import ConnectionPool, get_db
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2)
+    yield pool
+    pool.close()
+
+
+def test_released_connection_is_reused(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+
+
+def test_pragmas_applied_to_every_connection(pool):
+    first, second = pool.acquire(), pool.acquire()
+    for conn in (first, second):
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+    pool.release(first)
+    pool.release(second)
+
+
+def test_idle_connections_capped_by_max_size(pool):
+    connections = [pool.acquire() for _ in range(3)]
+    for conn in connections:
+        pool.release(conn)
+    assert pool._idle.qsize() == 2
+    # Лишнее соединение закрыто, а не оставлено висеть
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[-1].execute('SELECT 1')
+
+
+def test_connection_released_and_rolled_back_on_error(pool):
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+    with pytest.raises(RuntimeError):
+        with pool.connection(row_factory=sqlite3.Row) as conn:
+            conn.execute('INSERT INTO items DEFAULT VALUES')
+            raise RuntimeError
+    assert pool._idle.qsize() == 1
+    with pool.connection() as reused:
+        assert reused is conn
+        assert reused.row_factory is None
+        assert not reused.in_transaction
+        assert reused.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+
+
+def test_read_only_pool(tmp_path):
+    path = str(tmp_path / 'pool.db')
+    with ConnectionPool(path).connection() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+    readers = ConnectionPool(path, read_only=True)
+    with readers.connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute('INSERT INTO items DEFAULT VALUES')
+    readers.close()
+
+
+def test_request_connection_released_on_teardown(pool):
+    app = Flask(__name__)
+    db.init_app(app, pool, row_factory=sqlite3.Row)
+
+    @app.route('/boom')
+    def boom():
+        get_db().execute('SELECT 1')
+        raise RuntimeError
+
+    @app.route('/ok')
+    def ok():
+        conn = get_db()
+        assert conn is get_db()
+        assert conn.row_factory is sqlite3.Row
+        return {'value': conn.execute('SELECT 1').fetchone()[0]}
+
+    client = app.test_client()
+    assert client.get('/ok').json == {'value': 1}
+    assert pool._idle.qsize() == 1
+    assert client.get('/boom').status_code == 500
+    assert pool._idle.qsize() == 1
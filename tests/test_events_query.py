@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import seed_events, seed_students
+
+
+@pytest.fixture
+def events(client, app):
+    students = seed_students(client, 3)
+    with app.extensions['db_pool'].connection() as conn:
+        with conn:
+            conn.execute("INSERT INTO groups (group_name) VALUES ('ИВТ-222')")
+            conn.execute('UPDATE students SET group_id = 1 WHERE id IN (?, ?)', students[:2])
+            conn.execute("INSERT INTO education_periods VALUES (?, '01.09.2022', NULL, 'ИВТ-222')", (students[0],))
+    items = [
+        {'student_id': students[0], 'date': '2024-10-03', 'title': 'Сессия', 'category': 'Учёба'},
+        {'student_id': students[0], 'date': '2024-09-15', 'title': 'Турнир', 'category': 'Спорт'},
+        {'student_id': students[1], 'date': '2024-10-03', 'title': 'Олимпиада', 'category': 'Учёба'},
+        {'student_id': students[1], 'date': '2024-11-20', 'title': 'Концерт', 'category': 'Культура'},
+        {'student_id': students[2], 'date': '2024-09-01', 'title': 'Линейка', 'category': 'Учёба'},
+    ]
+    ids = seed_events(client, items)
+    return students, [dict(item, id=event_id) for item, event_id in zip(items, ids)]
+
+
+def titles(response):
+    assert response.status_code == 200
+    return [item['title'] for item in response.json['items']]
+
+
+def test_filters(client, events):
+    students, items = events
+    assert titles(client.get(f'/events?student_id={students[0]}')) == ['Сессия', 'Турнир']
+    assert titles(client.get('/events?group=ИВТ-222&category=Учёба')) == ['Сессия', 'Олимпиада']
+    assert titles(client.get('/events?from=2024-10-01&to=31.10.2024')) == ['Сессия', 'Олимпиада']
+
+
+@pytest.mark.parametrize('sort, expected', [
+    ('date', ['Линейка', 'Турнир', 'Сессия', 'Олимпиада', 'Концерт']),
+    ('-date', ['Концерт', 'Олимпиада', 'Сессия', 'Турнир', 'Линейка']),
+    ('-id', ['Линейка', 'Концерт', 'Олимпиада', 'Турнир', 'Сессия']),
+])
+def test_sorted_pages_follow_next_links(client, events, sort, expected):
+    seen, url = [], f'/events?sort={sort}&limit=2'
+    while url:
+        response = client.get(url)
+        seen += titles(response)
+        url = response.json['next']
+    assert seen == expected
+
+
+@pytest.mark.parametrize('sort, expected', [('date', ['Олимпиада', 'Концерт']), ('-date', ['Турнир', 'Линейка'])])
+def test_date_cursor_without_after_date(client, events, sort, expected):
+    _, items = events
+    # Курсор только с after_id: дата берётся из самого события (первое «Сессия», 2024-10-03)
+    assert titles(client.get(f"/events?sort={sort}&after_id={items[0]['id']}")) == expected
+
+
+def test_date_cursor_for_unknown_event_rejected(client, events):
+    assert client.get('/events?sort=date&after_id=999').status_code == 400
+    assert client.get('/events?sort=date&after_date=2024-10-01').status_code == 400
+
+
+@pytest.mark.parametrize('query', ['sort=title', 'student_id=first', 'from=вчера'])
+def test_bad_filters_rejected(client, events, query):
+    assert client.get(f'/events?{query}').status_code == 400
+
+
+def test_include_related_rows(client, events):
+    students, _ = events
+    response = client.get('/students?include=events,periods,group&limit=2')
+    assert response.status_code == 200
+    first, second = response.json['items']
+    assert [event['title'] for event in first['events']] == ['Турнир', 'Сессия']
+    assert first['periods'] == [{'start_date': '01.09.2022', 'end_date': None, 'group_name': 'ИВТ-222'}]
+    assert first['group'] == {'id': 1, 'group_name': 'ИВТ-222'}
+    assert second['periods'] == []
+    assert 'include=events' in response.json['next']
+
+    student = client.get(f'/students/{students[2]}?include=group,events').json
+    assert student['group'] is None
+    assert [event['title'] for event in student['events']] == ['Линейка']
+    assert client.get('/students?include=grades').status_code == 400
@@ -0,0 +1,80 @@
+import logging
+import time
+
+import pytest
+
+import api
+from conftest import add_student, seed_students
+from db import ConnectionPool
+from ingest import EventIngestQueue
+
+EVENT = {'date': '2024-10-01', 'title': 'Сессия', 'category': 'Учёба'}
+
+
+@pytest.fixture
+def queue_app(tmp_path):
+    app = api.create_app({'DATABASE': str(tmp_path / 'api.db'), 'SNAPSHOT_MODE': 'live', 'TESTING': True,
+                          'EVENT_INGEST_MODE': 'queue', 'EVENT_INGEST_FLUSH_INTERVAL': 0.01})
+    yield app
+    app.extensions['event_queue'].stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_queued_event_is_written(queue_app):
+    client = queue_app.test_client()
+    student_id = seed_students(client, 1)[0]
+    client.get('/events')
+    response = client.post('/events', json=dict(EVENT, student_id=student_id))
+    assert response.status_code == 202
+    event_queue = queue_app.extensions['event_queue']
+    wait_for(lambda: event_queue.metrics()['written'] == 1)
+    # Фоновая запись сбрасывает закэшированные списки событий
+    assert [item['title'] for item in client.get('/events').json['items']] == ['Сессия']
+    metrics = client.get('/ingest/metrics').json
+    assert (metrics['mode'], metrics['enqueued'], metrics['failed']) == ('queue', 1, 0)
+
+
+@pytest.mark.parametrize('body, status', [({'title': 'Без студента'}, 400), (dict(EVENT, student_id=999), 422),
+                                          (None, 400)])
+def test_rejected_before_queueing(queue_app, body, status):
+    response = queue_app.test_client().post('/events', json=body)
+    assert response.status_code == status
+    assert queue_app.extensions['event_queue'].metrics()['enqueued'] == 0
+
+
+def test_full_queue_and_shutdown(queue_app):
+    client = queue_app.test_client()
+    student_id = seed_students(client, 1)[0]
+    # Очередь без потока записи: вторая попытка упирается в ёмкость
+    queue_app.extensions['event_queue'].stop()
+    queue_app.extensions['event_queue'] = EventIngestQueue(queue_app.extensions['db_pool'], max_size=1)
+    assert client.post('/events', json=dict(EVENT, student_id=student_id)).status_code == 202
+    response = client.post('/events', json=dict(EVENT, student_id=student_id))
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+
+    queue_app.extensions['event_queue'].stop(timeout=0)
+    assert client.post('/events', json=dict(EVENT, student_id=student_id)).status_code == 503
+
+
+def test_events_rejected_after_queueing_are_logged(conn, tmp_path, caplog):
+    student_id = add_student(conn, 1)
+    other_id = add_student(conn, 2)
+    pool = ConnectionPool(str(tmp_path / 'test.db'))
+    event_queue = EventIngestQueue(pool, flush_interval=0.01)
+    event_queue.submit((student_id, '01.10.2024', 'Сессия', None, None))
+    event_queue.submit((other_id, '02.10.2024', 'Турнир', None, None))
+    with conn:
+        conn.execute('DELETE FROM students WHERE id = ?', (other_id,))
+
+    with caplog.at_level(logging.ERROR, logger='ingest'):
+        event_queue.start().stop()
+    assert (event_queue.metrics()['written'], event_queue.metrics()['failed']) == (1, 1)
+    assert "'Турнир'" in caplog.text
+    pool.close()
@@ -0,0 +1,78 @@
+import logging
+import os
+import re
+
+import api
+import metrics
+from conftest import seed_students
+from metrics import Histogram, format_labels, statement_kind
+
+
+def sample(text, name, **labels):
+    pattern = re.escape(name + format_labels(list(labels.items()))) + r' (\S+)'
+    match = re.search(pattern, text)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_requests_counted_by_route_and_status(client):
+    seed_students(client, 3)
+    before = client.get('/metrics').get_data(as_text=True)
+    client.get('/students')
+    client.get('/students/1')
+    client.get('/students/999')
+    after = client.get('/metrics')
+    assert after.mimetype == 'text/plain'
+    text = after.get_data(as_text=True)
+
+    def delta(name, **labels):
+        return sample(text, name, **labels) - sample(before, name, **labels)
+
+    assert delta('student_api_requests_total', route='/students', method='GET', status='200') == 1
+    assert delta('student_api_requests_total', route='/students/<int:id>', method='GET', status='404') == 1
+    # Три студента и версия change_log, по которой кэш ставит Last-Modified
+    assert delta('student_api_rows_read_total', route='/students', method='GET') == 4
+    assert delta('student_api_request_duration_seconds_count', route='/students', method='GET') == 1
+    assert 'student_api_request_duration_seconds_bucket{route="/students",method="GET",le="+Inf"}' in text
+    assert '# TYPE student_db_query_duration_seconds histogram' in text
+
+
+def test_rows_written_counted(client):
+    before = client.get('/metrics').get_data(as_text=True)
+    seed_students(client, 4)
+    text = client.get('/metrics').get_data(as_text=True)
+    labels = {'route': '/students/batch', 'method': 'POST'}
+    assert sample(text, 'student_api_rows_written_total', **labels) - \
+        sample(before, 'student_api_rows_written_total', **labels) >= 4
+
+
+def test_slow_queries_logged_with_plan(tmp_path, caplog):
+    app = api.create_app({'DATABASE': str(tmp_path / 'api.db'), 'SNAPSHOT_MODE': 'live', 'SLOW_QUERY_THRESHOLD': 0})
+    slow_before = metrics.REGISTRY.slow_queries
+    with caplog.at_level(logging.WARNING, logger='metrics'):
+        app.test_client().get('/students?limit=5')
+    assert metrics.REGISTRY.slow_queries > slow_before
+    assert 'Slow query' in caplog.text
+    assert 'plan:' in caplog.text
+    api.create_app({'DATABASE': str(tmp_path / 'api.db'), 'SNAPSHOT_MODE': 'live'})
+    assert metrics.REGISTRY.slow_query_threshold == metrics.SLOW_QUERY_THRESHOLD
+
+
+def test_profiling_only_when_enabled(tmp_path, client):
+    assert 'X-Profile' not in client.get('/students?profile=1').headers
+    app = api.create_app({'DATABASE': str(tmp_path / 'api.db'), 'SNAPSHOT_MODE': 'live', 'PROFILING': True,
+                          'PROFILE_DIR': str(tmp_path / 'profiles')})
+    path = app.test_client().get('/students?profile=1').headers['X-Profile']
+    assert os.path.dirname(path) == str(tmp_path / 'profiles')
+    assert os.path.getsize(path) > 0
+
+
+def test_histogram_and_label_rendering():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.render('latency', [('route', 'a"b')]) == [
+        'latency_bucket{route="a\\"b",le="0.1"} 1', 'latency_bucket{route="a\\"b",le="1.0"} 2',
+        'latency_bucket{route="a\\"b",le="+Inf"} 3', 'latency_sum{route="a\\"b"} 5.55',
+        'latency_count{route="a\\"b"} 3']
+    assert [statement_kind(sql) for sql in (' SELECT 1', 'insert into x', 'PRAGMA x', '')] == [
+        'select', 'insert', 'other', 'other']
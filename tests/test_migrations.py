@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+
+from conftest import add_event, add_student
+from db import MIGRATIONS, connect, create_base_schema, migrate, prune_change_log
+
+
+def test_fresh_database_reaches_latest_version(conn):
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_migrate_is_idempotent(conn):
+    migrate(conn)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_concurrent_migrations_apply_each_step_once(tmp_path):
+    # Воркеры сервера, десктоп и API открывают одну и ту же свежую базу одновременно
+    path = str(tmp_path / 'shared.db')
+    connections = [connect(path) for _ in range(4)]
+    barrier = threading.Barrier(len(connections))
+    errors = []
+
+    def run(conn):
+        barrier.wait()
+        try:
+            migrate(conn)
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(conn,)) for conn in connections]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert [conn.execute('PRAGMA user_version').fetchone()[0] for conn in connections] == [len(MIGRATIONS)] * 4
+    for conn in connections:
+        conn.close()
+
+
+def test_legacy_database_is_upgraded(tmp_path):
+    # База до миграций: только исходная схема, user_version = 0, даты в формате интерфейса
+    path = str(tmp_path / 'legacy.db')
+    legacy = sqlite3.connect(path)
+    create_base_schema(legacy)
+    legacy.execute("INSERT INTO students (first_name, last_name, birth_date, phone, email) "
+                   "VALUES ('Иван', 'Иванов', '05.03.2003', '+79000000001', 'ivan@example.edu')")
+    legacy.execute("INSERT INTO events (student_id, date, title, category) VALUES (1, '10.10.2023', 'Сессия', 'Учёба')")
+    legacy.commit()
+    legacy.close()
+
+    conn = connect(path)
+    migrate(conn)
+    assert conn.execute('SELECT birth_date_iso FROM students').fetchone()[0] == '2003-03-05'
+    assert conn.execute('SELECT date_iso FROM events').fetchone()[0] == '2023-10-10'
+    assert conn.execute('SELECT student_id, day, category, count FROM event_daily_counts').fetchall() == [
+        (1, '2023-10-10', 'Учёба', 1)]
+    assert conn.execute("SELECT rowid FROM students_fts WHERE students_fts MATCH 'иванов'").fetchall() == [(1,)]
+    conn.close()
+
+
+def test_iso_dates_follow_writes(conn):
+    student_id = add_student(conn, 1, birth_date='15.06.2004')
+    assert conn.execute('SELECT birth_date_iso FROM students WHERE id = ?', (student_id,)).fetchone()[0] == '2004-06-15'
+    with conn:
+        conn.execute("UPDATE students SET birth_date = '2005-01-02' WHERE id = ?", (student_id,))
+    assert conn.execute('SELECT birth_date_iso FROM students WHERE id = ?', (student_id,)).fetchone()[0] == '2005-01-02'
+    with conn:
+        conn.execute("UPDATE students SET birth_date = 'весна 2005' WHERE id = ?", (student_id,))
+    assert conn.execute('SELECT birth_date_iso FROM students WHERE id = ?', (student_id,)).fetchone()[0] is None
+
+
+def test_change_log_records_writes_once(conn):
+    student_id = add_student(conn, 1)
+    with conn:
+        conn.execute("UPDATE students SET birth_date = '02.02.2002' WHERE id = ?", (student_id,))
+        conn.execute('DELETE FROM students WHERE id = ?', (student_id,))
+    # Обновление *_iso триггером не порождает отдельной записи
+    assert conn.execute('SELECT table_name, row_id, operation FROM change_log ORDER BY version').fetchall() == [
+        ('students', student_id, 'insert'), ('students', student_id, 'update'), ('students', student_id, 'delete')]
+
+
+def test_prune_change_log_keeps_latest(conn):
+    for index in range(5):
+        add_student(conn, index)
+    prune_change_log(conn, keep=2)
+    assert [row[0] for row in conn.execute('SELECT version FROM change_log ORDER BY version')] == [4, 5]
+
+
+def test_full_text_search_follows_writes(conn):
+    student_id = add_student(conn, 1)
+
+    def found(query):
+        return [row[0] for row in conn.execute('SELECT rowid FROM students_fts WHERE students_fts MATCH ?', (query,))]
+
+    assert found('фамилия1') == [student_id]
+    with conn:
+        conn.execute("UPDATE students SET last_name = 'Петров' WHERE id = ?", (student_id,))
+    assert found('фамилия1') == []
+    assert found('петров') == [student_id]
+    with conn:
+        conn.execute('DELETE FROM students WHERE id = ?', (student_id,))
+    assert found('петров') == []
+
+
+def test_event_daily_counts_follow_writes(conn):
+    student_id = add_student(conn, 1)
+    first = add_event(conn, student_id, '01.10.2024')
+    add_event(conn, student_id, '01.10.2024')
+
+    def counts():
+        return conn.execute('SELECT day, category, count FROM event_daily_counts ORDER BY day').fetchall()
+
+    assert counts() == [('2024-10-01', 'Учёба', 2)]
+    with conn:
+        conn.execute("UPDATE events SET date = '2024-10-02' WHERE id = ?", (first,))
+    assert counts() == [('2024-10-01', 'Учёба', 1), ('2024-10-02', 'Учёба', 1)]
+    with conn:
+        conn.execute('DELETE FROM events WHERE student_id = ?', (student_id,))
+    assert counts() == []
+
+
+def test_event_filter_index_exists(conn):
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM events WHERE category = 'Учёба' AND date_iso >= '2024-01-01'")
+    assert any('idx_events_category_date' in row[3] for row in plan)
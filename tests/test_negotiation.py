@@ -0,0 +1,112 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+import negotiation
+from conftest import seed_events, seed_students
+from streaming import NDJSON_MIMETYPE
+
+
+def decompress(response):
+    encoding = response.headers['Content-Encoding']
+    return zlib.decompress(response.get_data(), negotiation.CONTENT_ENCODINGS[encoding])
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate'])
+def test_large_response_is_compressed(client, encoding):
+    seed_students(client, 50)
+    plain = client.get('/students?limit=50')
+    assert len(plain.get_data()) > negotiation.COMPRESSION_MIN_SIZE
+    assert 'Content-Encoding' not in plain.headers
+
+    response = client.get('/students?limit=50', headers={'Accept-Encoding': encoding})
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.vary
+    assert len(response.get_data()) < len(plain.get_data())
+    assert json.loads(decompress(response)) == plain.json
+
+
+def test_compressed_etag_is_weak_and_revalidates(client):
+    seed_students(client, 50)
+    plain = client.get('/students?limit=50')
+    response = client.get('/students?limit=50', headers={'Accept-Encoding': 'gzip'})
+    etag, weak = response.get_etag()
+    assert weak
+    assert (etag, False) == plain.get_etag()
+    revalidated = client.get('/students?limit=50', headers={'Accept-Encoding': 'gzip',
+                                                            'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_small_response_is_not_compressed(client):
+    seed_students(client, 1)
+    response = client.get('/students', headers={'Accept-Encoding': 'gzip'})
+    assert len(response.get_data()) < negotiation.COMPRESSION_MIN_SIZE
+    assert 'Content-Encoding' not in response.headers
+    # Vary ставится всегда: кэш не должен отдать несжатый ответ клиенту, ждущему gzip, и наоборот
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_stream_is_compressed_incrementally(client):
+    ids = seed_students(client, 1200)
+    response = client.get('/students?stream=1', headers={'Accept-Encoding': 'gzip'})
+    assert response.mimetype == NDJSON_MIMETYPE
+    assert response.headers['Content-Encoding'] == 'gzip'
+    rows = [json.loads(line) for line in gzip.decompress(response.get_data()).decode().splitlines()]
+    assert [row['id'] for row in rows] == ids
+
+
+def test_students_in_columns(client):
+    ids = seed_students(client, 3)
+    body = client.get('/students?format=columns&fields=email').json
+    assert body['fields'] == ['id', 'email']
+    assert body['columns'] == [ids, [f'batch{index}@example.edu' for index in range(3)]]
+    assert 'items' not in body
+    assert body['next_cursor'] is None
+
+
+def test_events_in_columns_keep_fields_when_empty(client):
+    body = client.get('/events?format=columns&fields=title').json
+    assert body['fields'] == ['id', 'title']
+    assert body['columns'] == [[], []]
+
+
+def test_desktop_routes_in_columns(client):
+    student_id = seed_students(client, 2)[0]
+    seed_events(client, [{'student_id': student_id, 'date': '2024-10-01', 'title': 'Сессия'}])
+    rows = client.get('/api/students').json
+    body = client.get('/api/students?format=columns').json
+    assert body['fields'][:3] == ['id', 'first_name', 'last_name']
+    assert [list(row) for row in zip(*body['columns'])] == rows
+
+    body = client.get(f'/api/students/{student_id}/events?format=columns').json
+    assert body['columns'][body['fields'].index('title')] == ['Сессия']
+
+
+def test_msgpack_only_on_request(client, monkeypatch):
+    seed_students(client, 1)
+    assert client.get('/students', headers={'Accept': '*/*'}).mimetype == negotiation.JSON_MIMETYPE
+    monkeypatch.setattr(negotiation, 'msgpack', None)
+    response = client.get('/students?fields=email', headers={'Accept': negotiation.MSGPACK_MIMETYPE})
+    # Без msgpack формат не предлагается: клиент получает JSON, а не 406
+    assert response.mimetype == negotiation.JSON_MIMETYPE
+    assert response.json['items'][0]['email'] == 'batch0@example.edu'
+
+
+@pytest.mark.skipif(negotiation.msgpack is None, reason='msgpack не установлен')
+def test_msgpack_response(client):
+    seed_students(client, 1)
+    response = client.get('/students?fields=email', headers={'Accept': negotiation.MSGPACK_MIMETYPE})
+    assert response.mimetype == negotiation.MSGPACK_MIMETYPE
+    assert negotiation.msgpack.unpackb(response.get_data())['items'][0]['email'] == 'batch0@example.edu'
+
+
+def test_json_keeps_cyrillic(app, client):
+    if negotiation.orjson is not None:
+        assert isinstance(app.json, negotiation.OrjsonProvider)
+    seed_students(client, 1)
+    data = client.get('/students?fields=first_name').get_data()
+    assert 'Имя0'.encode() in data
+    assert b'\\u' not in data
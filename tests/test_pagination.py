@@ -0,0 +1,60 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from conftest import seed_events, seed_students
+
+
+def walk(client, url):
+    # Идём по ссылкам next до конца, как клиент API
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append(response.json['items'])
+        url = response.json['next']
+    return pages
+
+
+def test_students_keyset_pages(client):
+    ids = seed_students(client, 7)
+    pages = walk(client, '/students?limit=3')
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [item['id'] for page in pages for item in page] == ids
+
+    first = client.get('/students?limit=3').json
+    assert first['next_cursor'] == ids[2]
+    assert client.get(f'/students?limit=3&after_id={ids[-1]}').json == {'items': [], 'next_cursor': None,
+                                                                         'next': None}
+
+
+def test_field_projection_keeps_id_and_next_link_params(client):
+    seed_students(client, 3)
+    response = client.get('/students?limit=2&fields=email,last_name').json
+    assert [sorted(item) for item in response['items']] == [['email', 'id', 'last_name']] * 2
+    assert parse_qs(urlsplit(response['next']).query) == {'after_id': [str(response['next_cursor'])], 'limit': ['2'],
+                                                         'fields': ['email,last_name']}
+    assert [sorted(item) for item in client.get(response['next']).json['items']] == [['email', 'id', 'last_name']]
+
+
+def test_events_keyset_pages(client):
+    student_id = seed_students(client, 1)[0]
+    ids = seed_events(client, [{'student_id': student_id, 'date': f'2024-10-{day:02d}', 'title': f'Событие {day}'}
+                               for day in range(1, 6)])
+    pages = walk(client, '/events?limit=2&fields=title')
+    assert [item['id'] for page in pages for item in page] == ids
+    assert [sorted(item) for item in pages[0]] == [['id', 'title']] * 2
+
+
+def test_limit_is_capped(client):
+    seed_students(client, 2)
+    assert len(client.get('/students?limit=100000').json['items']) == 2
+
+
+@pytest.mark.parametrize('query', ['after_id=abc', 'limit=ten', 'limit=0', 'limit=-5', 'fields=password',
+                                   'after_id=1.5'])
+@pytest.mark.parametrize('path', ['/students', '/events'])
+def test_malformed_page_args_rejected(client, path, query):
+    response = client.get(f'{path}?{query}')
+    assert response.status_code == 400
+    assert response.json['message']
@@ -0,0 +1,64 @@
+import json
+import sqlite3
+import threading
+import time
+import urllib.request
+
+import pytest
+from flask import Flask
+
+import api
+import serve
+from serve import BackgroundServer
+
+
+def get(server, path):
+    with urllib.request.urlopen(f'http://127.0.0.1:{server.server.effective_port}{path}', timeout=10) as response:
+        return response.status, response.read()
+
+
+def test_serves_api_and_stops(app):
+    server = BackgroundServer(app, port=0).start()
+    status, body = get(server, '/students')
+    assert status == 200
+    assert json.loads(body)['items'] == []
+    server.stop(timeout=5)
+    assert not server.thread.is_alive()
+
+
+def test_stop_finishes_requests_in_flight():
+    app = Flask(__name__)
+    started = threading.Event()
+
+    @app.route('/slow')
+    def slow():
+        started.set()
+        time.sleep(0.5)
+        return 'done'
+
+    server = BackgroundServer(app, port=0).start()
+    result = {}
+    client = threading.Thread(target=lambda: result.update(response=get(server, '/slow')))
+    client.start()
+    assert started.wait(5)
+    server.stop(timeout=5)
+    client.join(5)
+    assert result['response'] == (200, b'done')
+    assert not server.thread.is_alive()
+
+
+def test_workers_without_gunicorn_fail_clearly(monkeypatch, capsys):
+    monkeypatch.setattr(serve, 'BaseApplication', None)
+    monkeypatch.setattr('sys.argv', ['serve.py', '--workers', '4'])
+    with pytest.raises(SystemExit) as exit_info:
+        serve.main()
+    assert exit_info.value.code == 2
+    assert 'gunicorn' in capsys.readouterr().err
+
+
+def test_workers_skip_migrations(tmp_path):
+    path = str(tmp_path / 'worker.db')
+    api.create_app({'DATABASE': path, 'SNAPSHOT_MODE': 'live', 'MIGRATE': False})
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    conn.close()
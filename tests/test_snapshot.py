@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import api
+from conftest import add_student, seed_students, student_item
+from snapshot import SnapshotService, snapshot_path
+
+
+@pytest.fixture
+def service(conn, tmp_path):
+    service = SnapshotService(str(tmp_path / 'test.db'), max_age=60)
+    yield service
+    service.stop()
+
+
+def student_count(service, max_age=None):
+    with service.connection(max_age=max_age) as reader:
+        return reader.execute('SELECT COUNT(*) FROM students').fetchone()[0]
+
+
+def test_refresh_only_on_demand(conn, service):
+    assert service.refreshes == 0 and not os.path.exists(service.path)
+    add_student(conn, 1)
+    assert student_count(service) == 1
+    assert service.refreshes == 1
+
+
+def test_stale_within_max_age_without_copying(conn, service):
+    student_count(service)
+    add_student(conn, 1)
+    # Правка моложе max_age: читаем прежнюю копию, полного копирования нет
+    assert student_count(service) == 0
+    assert service.refreshes == 1
+    assert student_count(service, max_age=0) == 1
+    assert service.refreshes == 2
+
+
+def test_unchanged_database_is_not_copied_again(conn, service):
+    student_count(service)
+    student_count(service, max_age=0)
+    assert service.refreshes == 1
+    assert service.age() < 1
+
+
+def test_replica_file_is_per_process_and_removed(conn, tmp_path):
+    service = SnapshotService(str(tmp_path / 'test.db'))
+    assert service.path == snapshot_path(str(tmp_path / 'test.db'))
+    assert str(os.getpid()) in service.path
+    student_count(service)
+    assert os.path.exists(service.path)
+    service.stop()
+    assert not any(os.path.exists(service.path + suffix) for suffix in ('', '-wal', '-shm'))
+
+
+@pytest.fixture
+def replica_client(tmp_path):
+    app = api.create_app({'DATABASE': str(tmp_path / 'api.db'), 'SNAPSHOT_MODE': 'replica', 'SNAPSHOT_MAX_AGE': 60,
+                          'TESTING': True})
+    yield app.test_client()
+    app.extensions['snapshot'].stop()
+
+
+def test_lists_read_live_and_reports_read_replica(replica_client):
+    client = replica_client
+    seed_students(client, 2)
+    assert client.get('/reports/faculty').headers['X-Snapshot-Age']
+    assert client.post('/students', json=student_item(5)).status_code == 201
+
+    page = client.get('/students')
+    assert 'X-Snapshot-Age' not in page.headers
+    assert len(page.json['items']) == 3
+    assert len(client.get('/students/3').json) > 1
+
+    stream = client.get('/students?stream=1')
+    assert 'X-Snapshot-Age' in stream.headers
+    # Поток всей таблицы читается из реплики: в пределах SNAPSHOT_MAX_AGE новой записи в нём ещё нет
+    assert len(stream.get_data(as_text=True).splitlines()) == 2
+    assert client.get('/snapshot/stats').json['refreshes'] == 1
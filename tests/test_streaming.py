@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from conftest import seed_events, seed_students
+from streaming import NDJSON_MIMETYPE
+
+
+def lines(response):
+    assert response.mimetype == NDJSON_MIMETYPE
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('headers, query', [({}, '?stream=1'), ({'Accept': NDJSON_MIMETYPE}, '')])
+def test_students_stream_whole_table(client, headers, query):
+    ids = seed_students(client, 1200)
+    response = client.get(f'/students{query}', headers=headers)
+    assert response.is_streamed
+    assert [row['id'] for row in lines(response)] == ids
+
+
+def test_stream_respects_fields_and_cursor(client):
+    ids = seed_students(client, 5)
+    rows = lines(client.get(f'/students?stream=1&fields=email&after_id={ids[1]}'))
+    assert rows == [{'id': student_id, 'email': f'batch{index}@example.edu'}
+                    for index, student_id in enumerate(ids) if index > 1]
+
+
+def test_events_and_desktop_routes_stream(client):
+    student_id = seed_students(client, 1)[0]
+    seed_events(client, [{'student_id': student_id, 'date': '2024-10-01', 'title': 'Сессия'}])
+    assert [row['title'] for row in lines(client.get('/events?stream=1'))] == ['Сессия']
+    assert [row['title'] for row in lines(client.get('/api/events?stream=1'))] == ['Сессия']
+    assert len(lines(client.get('/api/students', headers={'Accept': NDJSON_MIMETYPE}))) == 1
+
+
+def test_json_stays_default_for_any_accept(client):
+    seed_students(client, 1)
+    response = client.get('/students', headers={'Accept': '*/*'})
+    assert response.mimetype == 'application/json'
+
+
+def test_stream_keeps_connection_until_closed(client, app):
+    seed_students(client, 1200)
+    pool = app.extensions['db_pool']
+    idle = pool._idle.qsize()
+    response = client.get('/students?stream=1', buffered=False)
+    # Ответ ещё не дочитан: его соединение не должно вернуться в пул к другим запросам
+    assert pool._idle.qsize() == idle - 1
+    assert len(b''.join(response.response).splitlines()) == 1200
+    response.close()
+    assert pool._idle.qsize() == idle
+
+
+def test_bad_stream_args_rejected(client):
+    assert client.get('/students?stream=1&after_id=x').status_code == 400
+    assert client.get('/students?stream=1&fields=password').status_code == 400
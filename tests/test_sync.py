@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from excel_io import sync_students
+
+
+def registry_row(index, **overrides):
+    row = {'Фамилия': f'Фамилия{index}', 'Имя': f'Имя{index}', 'Отчество': None,
+           'Дата рождения': datetime(2004, 9, 1), 'Телефон': f'+7922000{index:04d}',
+           'Email': f'sync{index}@example.edu', 'Адрес': None, 'Группа': 'ИВТ-222'}
+    row.update(overrides)
+    return row
+
+
+def registry(rows):
+    return list(enumerate(rows, start=2))
+
+
+def snapshot(conn):
+    return conn.execute('SELECT * FROM students ORDER BY id').fetchall()
+
+
+def changes(conn):
+    return conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+
+
+def add_group(conn):
+    with conn:
+        conn.execute("INSERT INTO groups (group_name) VALUES ('ИВТ-222')")
+
+
+def test_repeated_sync_writes_nothing(conn):
+    add_group(conn)
+    rows = registry([registry_row(index) for index in range(3)])
+    report = sync_students(conn, rows)
+    assert (report.inserted, report.updated, report.unchanged) == (3, 0, 0)
+    before, logged = snapshot(conn), changes(conn)
+
+    report = sync_students(conn, rows)
+    assert (report.inserted, report.updated, report.unchanged) == (0, 0, 3)
+    assert snapshot(conn) == before
+    assert changes(conn) == logged
+
+
+def test_sync_updates_only_changed_rows(conn):
+    add_group(conn)
+    sync_students(conn, registry([registry_row(index) for index in range(3)]))
+    logged = changes(conn)
+    # Тот же студент находится по email, телефон и адрес обновляются
+    rows = registry([registry_row(0), registry_row(1, Телефон='+79229999999', Адрес='ул. Ленина, 1'),
+                     registry_row(2)])
+    report = sync_students(conn, rows)
+    assert (report.inserted, report.updated, report.unchanged) == (0, 1, 2)
+    assert conn.execute("SELECT phone, address FROM students WHERE email = 'sync1@example.edu'").fetchone() == \
+        ('+79229999999', 'ул. Ленина, 1')
+    assert changes(conn) == logged + 1
+
+
+def test_dry_run_writes_nothing(conn):
+    add_group(conn)
+    sync_students(conn, registry([registry_row(0)]))
+    before, logged = snapshot(conn), changes(conn)
+    report = sync_students(conn, registry([registry_row(0, Имя='Другое'), registry_row(1)]), dry_run=True)
+    assert (report.inserted, report.updated, report.unchanged) == (1, 1, 0)
+    assert snapshot(conn) == before
+    assert changes(conn) == logged
+
+
+def test_conflicting_keys_are_reported(conn):
+    add_group(conn)
+    sync_students(conn, registry([registry_row(0), registry_row(1)]))
+    before = snapshot(conn)
+    # email первого студента, телефон второго; плюс повтор email внутри реестра
+    rows = registry([registry_row(0, Телефон='+79220000001'), registry_row(5, Email='sync5@example.edu'),
+                     registry_row(6, Email='sync5@example.edu')])
+    report = sync_students(conn, rows)
+    assert report.conflicts == 2
+    assert report.inserted == 1
+    assert snapshot(conn)[:2] == before
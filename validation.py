@@ -0,0 +1,12 @@
+import re
+
+EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
+PHONE_REGEX = re.compile(r"^\+?\d{10,15}$")
+
+
+def validate_email(email):
+    return EMAIL_REGEX.match(email) is not None
+
+
+def validate_phone(phone):
+    return PHONE_REGEX.match(phone) is not None
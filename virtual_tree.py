@@ -0,0 +1,78 @@
+from bisect import bisect_left
+
+PAGE_SIZE = 200
+# Следующая страница подгружается, когда видимая часть доходит до этой доли списка
+PREFETCH_THRESHOLD = 0.9
+
+
+class LazyTreeview:
+    def __init__(self, treeview, scrollbar, fetch_page, fetch_row, page_size=PAGE_SIZE):
+        self.treeview = treeview
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.fetch_row = fetch_row
+        self.page_size = page_size
+        self.last_id = 0
+        self.exhausted = False
+        self.paging = True
+        self.load_scheduled = False
+        treeview.configure(yscrollcommand=self.on_scroll)
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.paging and not self.exhausted and not self.load_scheduled and float(last) >= PREFETCH_THRESHOLD:
+            # after_idle: не вставляем строки прямо внутри обработчика прокрутки
+            self.load_scheduled = True
+            self.treeview.after_idle(self.load_next_page)
+
+    def load_next_page(self):
+        self.load_scheduled = False
+        if self.exhausted or not self.paging:
+            return
+        rows = self.fetch_page(self.last_id, self.page_size)
+        for row in rows:
+            if not self.treeview.exists(str(row[0])):
+                self.treeview.insert('', 'end', iid=str(row[0]), values=row)
+        if rows:
+            self.last_id = rows[-1][0]
+        self.exhausted = len(rows) < self.page_size
+
+    def reload(self):
+        self.treeview.delete(*self.treeview.get_children())
+        self.last_id = 0
+        self.exhausted = False
+        self.paging = True
+        self.load_next_page()
+
+    def show_rows(self, rows):
+        # Режим фиксированного списка (например, результаты поиска): постраничная подгрузка отключена
+        self.paging = False
+        self.treeview.delete(*self.treeview.get_children())
+        for row in rows:
+            self.treeview.insert('', 'end', iid=str(row[0]), values=row)
+
+    def refresh(self, row_id):
+        row = self.fetch_row(row_id)
+        if row is None:
+            self.remove(row_id)
+        else:
+            self.upsert(row)
+        return row
+
+    def upsert(self, row):
+        iid = str(row[0])
+        if self.treeview.exists(iid):
+            self.treeview.item(iid, values=row)
+        elif self.paging and (self.exhausted or row[0] <= self.last_id):
+            # Строки за пределами загруженных страниц появятся при прокрутке сами
+            children = self.treeview.get_children()
+            if not children or int(children[-1]) < row[0]:
+                index = 'end'
+            else:
+                index = bisect_left([int(child) for child in children], row[0])
+            self.treeview.insert('', index, iid=iid, values=row)
+
+    def remove(self, row_id):
+        iid = str(row_id)
+        if self.treeview.exists(iid):
+            self.treeview.delete(iid)